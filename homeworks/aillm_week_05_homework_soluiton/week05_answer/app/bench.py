@@ -0,0 +1,125 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+from pathlib import Path
+
+from app.reader import stream_rows
+
+# Offline throughput benchmark for the ticket pipeline.
+#
+#   python -m app.bench --rows 2000 --concurrency 1,8,32 --pack-size 1,5 --sink-batch 1,256
+#
+# Every configuration runs in a fresh spawned process against app.fake_llm, so
+# module state (cache, metrics) and peak RSS are per configuration. Nothing
+# here imports app.llm_chain in the parent: the fake must be selected (via
+# TICKET_FAKE_LLM) before the chain module is first imported.
+
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / "support_tickets_minimal.csv"
+
+def _ints(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bench",
+                                     description="Offline throughput benchmark with a simulated chat model.")
+    parser.add_argument("--csv", default=str(DEFAULT_CSV), help="tickets to replay (cycled up to --rows)")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32], help="comma list (1 = serial)")
+    parser.add_argument("--pack-size", type=_ints, default=[1], help="comma list")
+    parser.add_argument("--sink-batch", type=_ints, default=[256], help="comma list")
+    parser.add_argument("--fsync", default="none", help="comma list of none,batch,close")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median fake call latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal spread (0 = fixed)")
+    parser.add_argument("--per-ticket-ms", type=float, default=20.0, help="extra latency per packed ticket")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--extra", default="", help="extra app.main flags for every config, e.g. '--prefilter'")
+    parser.add_argument("--out", default=None, help="write results as JSON here")
+    return parser.parse_args(argv)
+
+def synth_rows(csv_path: str, n: int):
+    base = list(stream_rows(csv_path))
+    # unique ids and text, so caches/dedup (if enabled via --extra) don't hide the work
+    return [(f"BENCH-{i:07d}", f"{base[i % len(base)][1]} (#{i})") for i in range(n)]
+
+def _peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes vs KiB
+
+def run_config(config: dict, rows, fake: dict, extra: str) -> dict:
+    """Runs in a fresh process: one configuration end to end."""
+    os.environ["TICKET_FAKE_LLM"] = json.dumps(fake)
+    from app import main as runner
+    from app.metrics import metrics
+
+    runner.logger.setLevel(logging.WARNING)  # no per-row log lines
+    with tempfile.TemporaryDirectory() as tmp:
+        flags = [os.path.join(tmp, "unused.csv"),
+                 "--concurrency", str(config["concurrency"]),
+                 "--pack-size", str(config["pack_size"]),
+                 "--sink-batch", str(config["sink_batch"]),
+                 "--fsync", config["fsync"]]
+        if config["concurrency"] > 1:
+            flags.append("--async")
+        args = runner.parse_args(flags + extra.split())
+        runner.configure(args)
+
+        started = time.perf_counter()
+        done = runner.process(iter(rows), Path(tmp) / "outputs.jsonl", "bench", args)
+        elapsed = time.perf_counter() - started
+
+    stages = metrics.summary()["stages"]
+    return {
+        **config,
+        "rows": len(rows),
+        "done": done,
+        "elapsed_s": round(elapsed, 3),
+        "tickets_per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+        "network_p99_ms": stages.get("network", {}).get("p99_ms", 0.0),
+        "chunk_p99_ms": stages.get("chunk", {}).get("p99_ms", 0.0),
+        "llm_calls": stages.get("network", {}).get("count", 0),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = synth_rows(args.csv, args.rows)
+    fake = {"latency_ms": args.latency_ms, "latency_sigma": args.latency_sigma,
+            "per_ticket_ms": args.per_ticket_ms, "error_rate": args.error_rate, "seed": args.seed}
+    grid = [
+        {"concurrency": c, "pack_size": p, "sink_batch": b, "fsync": f}
+        for c, p, b, f in itertools.product(args.concurrency, args.pack_size, args.sink_batch,
+                                            args.fsync.split(","))
+    ]
+
+    ctx = mp.get_context("spawn")
+    header = f"{'conc':>5} {'pack':>5} {'sink':>5} {'fsync':>6} {'tickets/s':>10} {'calls':>6} " \
+             f"{'net p99 ms':>11} {'chunk p99 ms':>13} {'peak RSS MB':>12}"
+    print(header)
+    print("-" * len(header))
+    results = []
+    for config in grid:
+        # one process per config: clean module state and an honest peak RSS
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            r = pool.submit(run_config, config, rows, fake, args.extra).result()
+        results.append(r)
+        print(f"{r['concurrency']:>5} {r['pack_size']:>5} {r['sink_batch']:>5} {r['fsync']:>6} "
+              f"{r['tickets_per_s']:>10.2f} {r['llm_calls']:>6} {r['network_p99_ms']:>11.1f} "
+              f"{r['chunk_p99_ms']:>13.1f} {r['peak_rss_mb']:>12.1f}", flush=True)
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps({"fake_llm": fake, "results": results}, indent=2),
+                                  encoding="utf-8")
+        print(f"\nResults written to {args.out}")
+
+if __name__ == "__main__":
+    main()
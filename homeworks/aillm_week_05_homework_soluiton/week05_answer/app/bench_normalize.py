@@ -0,0 +1,174 @@
+import argparse
+import math
+import random
+import re
+import sys
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from app import postprocess as pp
+
+# Micro-benchmark: per-value vs columnar entity normalization, against the old
+# per-row amount parser.
+#
+#   python -m app.bench_normalize --rows 20000 --batch 8,64,256,4096 --max-calls 50
+#
+# Also checks that the per-value and columnar paths agree on every sample, and
+# counts amounts the old parser misread (it dropped every comma, so
+# "1.250,50 TL" became 1.25). The runner only uses the per-value rules (and
+# pp.parse_amounts in the pre-classifier); the columnar period and ticket id
+# rules below exist for this comparison.
+
+SAMPLES = {
+    # raw amount -> expected float
+    "1.250,50 TL": 1250.5, "200 TL": 200.0, "49.99": 49.99, "₺3,5": 3.5, "1.250 TL": 1250.0,
+    "12.000,00 lira": 12000.0, "yaklaşık 75 TL": 75.0, "1,250.50": 1250.5, 149.9: 149.9, 320: 320.0,
+    "yok": None, "": None,
+}
+PERIODS = ["Mart 2024", "MAYIS 2023", "03/2024", "2024-3", "Ağustos, 2022", "geçen ay", "  ", None]
+TICKET_IDS = ["#45721", " tkt-9 ", 45721, 45721.0, "", None]
+
+# --- columnar versions of the period and ticket id rules ---
+
+def _none_for_missing(values: "pd.Series") -> "pd.Series":
+    values = values.astype(object)
+    return values.where(values.notna(), None)
+
+def normalize_periods(values: "pd.Series") -> "pd.Series":
+    """Columnar pp.normalize_period: YYYY-MM when a month and year can be read, else trimmed text."""
+    values = pd.Series(values, dtype=object)
+    is_text = pp._mask(values, pp._is_text)
+    out = values.where(is_text, None)
+    if not is_text.any():
+        return _none_for_missing(out)
+
+    text = values[is_text].astype(str).str.strip().astype(object)
+    folded = text.str.translate(pp._TR_UPPER).str.lower().str.translate(pp._FOLD)
+    year = pd.Series(None, index=text.index, dtype=object)
+    month = pd.Series(np.nan, index=text.index, dtype=float)
+    for pattern in pp.PERIOD_PATTERNS:
+        m = folded.str.extract(pattern)
+        take = year.isna() & m["year"].notna()
+        year[take] = m.loc[take, "year"]
+        month[take] = m.loc[take, "month"].map(lambda v: pp.MONTHS.get(v) or int(v))
+    ok = year.notna() & month.between(1, 12)
+
+    text = text.where(text != "", None)
+    text[ok] = year[ok] + "-" + month[ok].astype(int).astype(str).str.zfill(2)
+    out[text.index] = text
+    return _none_for_missing(out)
+
+def normalize_ticket_ids(values: "pd.Series") -> "pd.Series":
+    """Columnar pp.normalize_ticket_id: trimmed upper-case strings without a leading '#'."""
+    values = pd.Series(values, dtype=object)
+    is_number = pp._mask(values, pp._is_number)
+    is_text = pp._mask(values, pp._is_text)
+    out = values.where(is_text | is_number, None)
+    if is_number.any():
+        out[is_number] = values[is_number].map(lambda v: str(int(v)) if float(v).is_integer() else str(v))
+    if is_text.any():
+        text = values[is_text].astype(str).str.strip().str.lstrip("#").str.strip().str.upper()
+        out[text.index] = text.where(text != "", None)
+    return _none_for_missing(out)
+
+def legacy_normalize_amount_like(value: Any):
+    """The per-row parser llm_chain used before app.postprocess."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        m = re.search(r"[-+]?\d+(?:\.\d+)?", value.replace(",", ""))
+        return float(m.group(0)) if m else None
+    return None
+
+def _ints(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+def _same(a, b) -> bool:
+    missing = lambda v: v is None or (isinstance(v, float) and math.isnan(v))
+    return (missing(a) and missing(b)) or a == b
+
+def _rate(fn, values, batch: int, max_calls: int) -> float:
+    """Values per second through fn, called on `batch` values at a time for at most max_calls calls."""
+    values = values[:batch * max_calls]
+    started = time.perf_counter()
+    for i in range(0, len(values), batch):
+        fn(values[i:i + batch])
+    return len(values) / (time.perf_counter() - started)
+
+def check_agreement() -> int:
+    """Per-value and columnar paths must agree; returns the number of mismatches."""
+    pairs = [
+        (list(SAMPLES), pp.parse_amount, pp.parse_amounts),
+        (PERIODS, pp.normalize_period, normalize_periods),
+        (TICKET_IDS, pp.normalize_ticket_id, normalize_ticket_ids),
+    ]
+    mismatches = 0
+    for values, value_fn, column_fn in pairs:
+        columnar = column_fn(pd.Series(values, dtype=object)).tolist()
+        for value, col in zip(values, columnar):
+            if not _same(value_fn(value), col):
+                print(f"  mismatch for {value!r}: per-value {value_fn(value)!r}, columnar {col!r}")
+                mismatches += 1
+    return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bench_normalize",
+                                     description="Per-value vs columnar entity normalization.")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--batch", type=_ints, default=[8, 64, 256, 4096], help="comma list of batch sizes")
+    # every columnar call pays a fixed pandas cost, so small batches are timed on fewer rows
+    parser.add_argument("--max-calls", type=int, default=50, help="calls timed per batch size and path (default: 50)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    mismatches = check_agreement()
+    print(f"per-value vs columnar: {mismatches} mismatches\n")
+
+    rng = random.Random(args.seed)
+    amounts = [rng.choice(list(SAMPLES)) for _ in range(args.rows)]
+    periods = [rng.choice(PERIODS) for _ in range(args.rows)]
+    ticket_ids = [rng.choice(TICKET_IDS) for _ in range(args.rows)]
+
+    misread = {
+        "legacy": sum(1 for v in amounts if not _same(legacy_normalize_amount_like(v), SAMPLES[v])),
+        "postprocess": sum(1 for v in amounts if not _same(pp.parse_amount(v), SAMPLES[v])),
+    }
+    print(f"amounts misread out of {args.rows}: legacy {misread['legacy']}, postprocess {misread['postprocess']}\n")
+
+    per_row = lambda batch: [legacy_normalize_amount_like(v) for v in batch]
+    per_value = lambda batch: [pp.parse_amount(v) for v in batch]
+    columnar = lambda batch: pp.parse_amounts(pd.Series(batch, dtype=object))
+    entities_value = lambda batch: [
+        (pp.parse_amount(a), pp.normalize_period(p), pp.normalize_ticket_id(t)) for a, p, t in batch]
+    entities_columnar = lambda batch: (
+        pp.parse_amounts(pd.Series([a for a, _, _ in batch], dtype=object)),
+        normalize_periods(pd.Series([p for _, p, _ in batch], dtype=object)),
+        normalize_ticket_ids(pd.Series([t for _, _, t in batch], dtype=object)),
+    )
+    triples = list(zip(amounts, periods, ticket_ids))
+
+    header = f"{'batch':>6} {'legacy amt/s':>13} {'per-value amt/s':>16} {'columnar amt/s':>15} " \
+             f"{'per-value ent/s':>16} {'columnar ent/s':>15}"
+    print(header)
+    print("-" * len(header))
+    paths = ((per_row, amounts), (per_value, amounts), (columnar, amounts),
+             (entities_value, triples), (entities_columnar, triples))
+    progress = sys.stderr.isatty()  # a live status line; rows below go to stdout as each batch size finishes
+    for batch in args.batch:
+        rates = []
+        for k, (fn, values) in enumerate(paths):
+            if progress:
+                print(f"\r{batch:>6} timing path {k + 1}/{len(paths)} ...", end="", file=sys.stderr, flush=True)
+            rates.append(_rate(fn, values, batch, args.max_calls))
+        if progress:
+            print("\r" + " " * len(header) + "\r", end="", file=sys.stderr, flush=True)
+        print(f"{batch:>6} {rates[0]:>13,.0f} {rates[1]:>16,.0f} {rates[2]:>15,.0f} "
+              f"{rates[3]:>16,.0f} {rates[4]:>15,.0f}", flush=True)
+
+if __name__ == "__main__":
+    main()
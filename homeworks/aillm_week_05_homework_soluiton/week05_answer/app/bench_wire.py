@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import statistics
+import time
+from pathlib import Path
+
+from app import llm_chain
+from app.fake_llm import CANNED_PAYLOADS, FakeTicketChatModel
+from app.metrics import metrics
+from app.reader import stream_rows
+from app.wire import compact, expand
+
+# Benchmark: full vs compact wire format (--wire), output tokens and latency per ticket.
+#
+#   python -m app.bench_wire --rows 200                  # offline, against app.fake_llm
+#   python -m app.bench_wire --rows 40 --live            # real Gemini calls (GOOGLE_API_KEY)
+#
+# Offline, the length of the fake model's answer sets both its output tokens
+# (~4 chars/token) and its decode time (--decode-ms-per-token), so the table
+# shows what the shorter answer buys at that decode speed. --live uses the
+# provider's token counts and wall latency. Either way, every compact answer is
+# expanded back and compared field by field with the full answer for the same
+# ticket (offline they must match exactly; live the model may also just answer
+# differently).
+
+DEFAULT_CSV = Path(__file__).resolve().parent.parent / "support_tickets_minimal.csv"
+FORMATS = ("full", "compact")
+
+async def run_format(fmt: str, rows, concurrency: int) -> dict:
+    llm_chain.configure_wire(fmt)
+    metrics.reset()
+    sem = asyncio.Semaphore(concurrency)
+    latencies, results = [], {}
+
+    async def one(source_id: str, ticket_text: str):
+        async with sem:
+            started = time.perf_counter()
+            try:
+                results[source_id] = (await llm_chain.aextract_ticket(ticket_text)).model_dump()
+            except Exception as e:
+                logging.getLogger("week05").warning("%s failed (%s): %s", source_id, fmt, e)
+                results[source_id] = None
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(sid, text) for sid, text in rows))
+    latencies.sort()
+    return {
+        "format": fmt,
+        "tickets": len(rows),
+        "failed": sum(1 for payload in results.values() if payload is None),
+        "out_tokens": metrics.tokens["output"] / len(rows),
+        "in_tokens": metrics.tokens["input"] / len(rows),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        "mean_ms": 1000 * statistics.fmean(latencies),
+        "results": results,
+    }
+
+def _field_agreement(full: dict, short: dict) -> float:
+    fields = same = 0
+    for sid, a in full.items():
+        b = short.get(sid)
+        if a is None or b is None:
+            continue
+        flat_a = {**{k: v for k, v in a.items() if k != "entities"}, **a["entities"]}
+        flat_b = {**{k: v for k, v in b.items() if k != "entities"}, **b["entities"]}
+        fields += len(flat_a)
+        same += sum(1 for k, v in flat_a.items() if flat_b.get(k) == v)
+    return same / fields if fields else 0.0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bench_wire",
+                                     description="Full vs compact structured-output keys.")
+    parser.add_argument("--csv", default=str(DEFAULT_CSV), help="tickets to replay (cycled up to --rows)")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--live", action="store_true", help="call the real model instead of app.fake_llm")
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="fake: median time to first token")
+    parser.add_argument("--decode-ms-per-token", type=float, default=5.0, help="fake: time per output token")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    lossless = all(expand(compact(p)) == p for p in CANNED_PAYLOADS)
+    print(f"expand(compact(x)) == x on canned payloads: {lossless}")
+
+    base = list(stream_rows(args.csv))
+    rows = [(f"{sid}#{i}", text) for i, (sid, text) in zip(range(args.rows), itertools.cycle(base))]
+    if not args.live:
+        llm_chain.set_llm(FakeTicketChatModel(latency_ms=args.latency_ms, latency_sigma=0.2, seed=args.seed,
+                                              output_tokens_per_ticket=None,
+                                              decode_ms_per_token=args.decode_ms_per_token))
+
+    runs = [asyncio.run(run_format(fmt, rows, args.concurrency)) for fmt in FORMATS]
+    print(f"\n{'wire':>8} {'tickets':>8} {'failed':>7} {'in tok':>7} {'out tok':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    for r in runs:
+        print(f"{r['format']:>8} {r['tickets']:>8} {r['failed']:>7} {r['in_tokens']:>7.0f} {r['out_tokens']:>8.1f} "
+              f"{r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} {r['mean_ms']:>8.0f}")
+    full, short = runs
+    saved = 1 - short["out_tokens"] / full["out_tokens"] if full["out_tokens"] else 0.0
+    faster = 1 - short["mean_ms"] / full["mean_ms"] if full["mean_ms"] else 0.0
+    print(f"\ncompact: {100 * saved:.1f}% fewer output tokens, {100 * faster:.1f}% lower mean latency per ticket")
+    print(f"field agreement compact vs full: {100 * _field_agreement(full['results'], short['results']):.1f}%")
+
+if __name__ == "__main__":
+    main()
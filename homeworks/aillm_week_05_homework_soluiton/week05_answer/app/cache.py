@@ -0,0 +1,121 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+from typing import Optional
+
+# On-disk, content-addressed cache for extraction results.
+# Key = sha256(namespace + normalized ticket text), where the namespace pins the
+# prompt hash, model name and schema version so a prompt/schema/model change
+# never serves stale payloads.
+
+def normalize_text(text: str) -> str:
+    # NFKC + casefold + collapsed whitespace: re-submitted tickets that only
+    # differ in spacing or casing share one entry
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+# with max_entries, eviction trims this share of it at once, so the table is
+# only counted once per batch of puts rather than on every put
+EVICT_BATCH_SHARE = 0.01
+
+def make_namespace(prompt_hash: str, model: str, schema_version: str) -> str:
+    return f"{prompt_hash}:{model}:{schema_version}"
+
+class TicketCache:
+    def __init__(self, path, namespace: str, max_entries: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        # isolation_level=None -> autocommit; WAL keeps readers and the writer apart
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " key TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON extractions(last_access)")
+        # running row count, kept up to date by put/get and re-read on every eviction
+        # (shard workers may share the file)
+        self._count = None
+        if max_entries is not None:
+            self._evict_batch = max(1, int(max_entries * EVICT_BATCH_SHARE))
+            (self._count,) = self.conn.execute("SELECT COUNT(*) FROM extractions").fetchone()
+
+    def key(self, ticket_text: str) -> str:
+        raw = self.namespace + "\x00" + normalize_text(ticket_text)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, ticket_text: str) -> Optional[dict]:
+        key = self.key(ticket_text)
+        row = self.conn.execute(
+            "SELECT payload, created_at FROM extractions WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            deleted = self.conn.execute("DELETE FROM extractions WHERE key = ?", (key,)).rowcount
+            if self._count is not None:
+                self._count -= deleted
+            self.evicted += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.conn.execute("UPDATE extractions SET last_access = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, ticket_text: str, payload: dict):
+        now = time.time()
+        row = (self.key(ticket_text), json.dumps(payload, ensure_ascii=False), now, now)
+        inserted = self.conn.execute(
+            "INSERT OR IGNORE INTO extractions (key, payload, created_at, last_access) VALUES (?, ?, ?, ?)", row
+        ).rowcount
+        if not inserted:
+            self.conn.execute(
+                "UPDATE extractions SET payload = ?, created_at = ?, last_access = ? WHERE key = ?",
+                row[1:] + row[:1],
+            )
+        elif self._count is not None:
+            self._count += 1
+            if self._count > self.max_entries:
+                self._evict_lru()
+
+    def _evict_lru(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM extractions").fetchone()
+        # down to one batch below the limit, so the next count is a batch of puts away
+        overflow = count - self.max_entries + self._evict_batch if count > self.max_entries else 0
+        if overflow > 0:
+            overflow = self.conn.execute(
+                "DELETE FROM extractions WHERE key IN ("
+                " SELECT key FROM extractions ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            ).rowcount
+            self.evicted += overflow
+        self._count = count - overflow
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
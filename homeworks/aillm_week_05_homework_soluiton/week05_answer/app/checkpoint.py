@@ -0,0 +1,96 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, Set
+
+# Progress manifests for resumable runs.
+# Every run writes logs/runs/<run_id>.json; outputs.jsonl stays the source of
+# truth for which source_ids are done, the manifest just says which run to resume.
+# `done` follows the sink's group commits (advance is its on_commit hook), so
+# it never claims more than is on disk and never forces a commit of its own.
+
+class RunManifest:
+    def __init__(self, runs_dir, run_id: str, csv_path: str, total_rows: int,
+                 skipped: int = 0, every: int = 100, every_seconds: float = 5.0, shards: int = 1):
+        self.path = Path(runs_dir) / f"{run_id}.json"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.every = every
+        self.every_seconds = every_seconds
+        self._since_write = 0
+        self._last_write = 0.0
+
+        previous = load_manifest(self.path) or {}
+        self.data = {
+            "run_id": run_id,
+            "csv_path": str(Path(csv_path).resolve()),
+            "status": "running",
+            "total_rows": total_rows,
+            "skipped": skipped,
+            "shards": shards,  # --resume must split the CSV the same way
+            "done": 0,
+            "started_at": previous.get("started_at", time.time()),
+            "resumes": previous.get("resumes", -1) + 1,
+            "updated_at": time.time(),
+        }
+        self.write()
+
+    def advance(self, n: int = 1):
+        self.data["done"] += n
+        self._since_write += n
+        if self._since_write >= self.every or time.time() - self._last_write >= self.every_seconds:
+            self.write()
+
+    def finish(self, status: str = "completed"):
+        self.data["status"] = status
+        self.write()
+
+    def write(self):
+        self.data["updated_at"] = time.time()
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._since_write = 0
+        self._last_write = time.time()
+
+def load_manifest(path) -> Optional[dict]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def latest_unfinished_run(runs_dir, csv_path: str) -> Optional[str]:
+    csv_path = str(Path(csv_path).resolve())
+    candidates = []
+    for path in Path(runs_dir).glob("*.json"):
+        data = load_manifest(path)
+        if data and data.get("csv_path") == csv_path and data.get("status") != "completed":
+            candidates.append((data.get("updated_at", 0), data["run_id"]))
+    return max(candidates)[1] if candidates else None
+
+def completed_source_ids(out_path, run_id: str) -> Set[str]:
+    done: Set[str] = set()
+    if not Path(out_path).exists():
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            # cheap substring check first; most lines belong to other runs
+            if run_id not in line:
+                continue
+            try:
+                meta = json.loads(line)["run_meta"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue  # torn last line from a killed run
+            if meta.get("run_id") == run_id:
+                done.add(str(meta.get("source_id")))
+    return done
+
+def repair_tail(out_path):
+    # a killed run can leave a half-written last line; start the next record on a fresh line
+    path = Path(out_path)
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
@@ -0,0 +1,82 @@
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Near-duplicate collapsing with MinHash + LSH banding.
+# The first ticket of a cluster becomes its representative and is extracted;
+# later tickets whose estimated Jaccard similarity (character shingles) clears
+# the threshold reuse its result and point at it with `dedup_of`.
+# Tickets that mention different numbers (amounts, ticket ids, dates) are never
+# collapsed, since those end up in `entities`.
+
+_PRIME = (1 << 31) - 1  # Mersenne prime; a*x+b stays well inside uint64
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 8,
+                 shingle: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        # band key -> representative ids; representative id -> (signature, numbers)
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._reps: Dict[str, Tuple[np.ndarray, Tuple[str, ...]]] = {}
+        self.collapsed = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        norm = _normalize(text)
+        k = self.shingle
+        shingles = {norm[i:i + k] for i in range(max(1, len(norm) - k + 1))}
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles),
+                        dtype=np.uint64, count=len(shingles))
+        # (num_perm, n_shingles) in one shot, min over shingles
+        hashed = (self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray):
+        r = self.rows
+        return [sig[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def add_or_match(self, source_id: str, text: str) -> Optional[str]:
+        """Representative id if `text` is a near-duplicate of one, else registers it and returns None."""
+        sig = self.signature(text)
+        numbers = tuple(sorted(_NUMBER.findall(text)))
+        keys = self._band_keys(sig)
+
+        seen = set()
+        for band, key in enumerate(keys):
+            for rep_id in self._buckets[band].get(key, ()):
+                if rep_id in seen:
+                    continue
+                seen.add(rep_id)
+                rep_sig, rep_numbers = self._reps[rep_id]
+                if rep_numbers == numbers and np.mean(rep_sig == sig) >= self.threshold:
+                    self.collapsed += 1
+                    return rep_id
+
+        self._reps[source_id] = (sig, numbers)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(source_id)
+        return None
+
+    def __contains__(self, source_id: str) -> bool:
+        return source_id in self._reps
+
+    @property
+    def clusters(self) -> int:
+        return len(self._reps)
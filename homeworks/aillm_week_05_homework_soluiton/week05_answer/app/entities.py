@@ -0,0 +1,87 @@
+import hashlib
+import json
+import re
+from typing import Optional
+
+from app.postprocess import PERIOD_PATTERNS, fold, normalize_period, parse_amount
+
+# Deterministic extractors for `Entities` (--hybrid-entities).
+# Ticket numbers, amounts, invoice periods, devices and address moves are
+# written in a handful of fixed shapes, so regexes and a small gazetteer find
+# them without a model call; in hybrid mode the LLM only returns the top-level
+# enums and summary and these fill `entities` before validation. Patterns run
+# on fold()ed text (lower case, Turkish letters folded to ASCII) and return the
+# same canonical values postprocess.normalize_entities produces. Nothing found
+# is null, as the schema allows; address_move is True or null, never False.
+
+# number followed by a currency marker; Turkish grouping (1.250,50) handled by parse_amount(s)
+AMOUNT = r"(\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?)\s*(?:tl|₺|lira)\b"
+
+# "bilet numarası 45721", "talep no: 45721", "ticket #45721", "45721 numaralı talebim"
+# (tale[pb], kayi?[td]: Turkish stems change before a suffix, talep -> talebim, kayıt -> kaydım)
+TICKET_ID_PATTERNS = (
+    r"\b(?:bilet|tale[pb]|kayi?[td]|basvuru|ticket)\w*\s*(?:no\b|numara\w*|#)?\s*[:.]?\s*#?\s*(\d{4,})\b",
+    r"\b(\d{4,})\s*(?:no\.?|numarali)\s*(?:bilet|tale[pb]|kayi?[td]|basvuru)",
+    r"(?:^|\s)#(\d{4,})\b",
+)
+
+# phrase -> canonical device; the earliest mention in the ticket wins
+DEVICES = {
+    r"\bmodem": "modem",
+    r"\brouter": "router",
+    r"\b(?:uydu alicisi|tv box|set ?top box)": "set-top box",
+    r"\b(?:mobil uygulama|uygulama(?:m|da|yi|nin)?\b)": "mobile app",
+    r"\b(?:telefonum|cep telefon|akilli telefon)": "phone",
+    r"\btablet": "tablet",
+    r"\b(?:bilgisayar|laptop|dizustu)": "computer",
+}
+
+ADDRESS_MOVE = r"\btasin|\bnakil|\bnakl|adres degisikligi|adresimi degistir|yeni adres"
+
+# part of the cache namespace in hybrid mode: changing a pattern invalidates cached entities
+PATTERNS_HASH = hashlib.sha256(json.dumps(
+    [AMOUNT, TICKET_ID_PATTERNS, PERIOD_PATTERNS, DEVICES, ADDRESS_MOVE], sort_keys=True
+).encode("utf-8")).hexdigest()[:16]
+
+_AMOUNT_RE = re.compile(AMOUNT)
+_TICKET_ID_RES = [re.compile(p) for p in TICKET_ID_PATTERNS]
+# month-name periods only: a bare 03/2024 inside free text is as likely part of a date
+_PERIOD_RES = [re.compile(p) for p in PERIOD_PATTERNS[:2]]
+_DEVICE_RES = [(re.compile(p), device) for p, device in DEVICES.items()]
+_ADDRESS_MOVE_RE = re.compile(ADDRESS_MOVE)
+
+def find_amount(folded: str) -> Optional[float]:
+    m = _AMOUNT_RE.search(folded)
+    return parse_amount(m.group(1)) if m else None
+
+def find_ticket_id(folded: str) -> Optional[str]:
+    for pattern in _TICKET_ID_RES:
+        m = pattern.search(folded)
+        if m:
+            return m.group(1)
+    return None
+
+def find_invoice_period(folded: str) -> Optional[str]:
+    for pattern in _PERIOD_RES:
+        m = pattern.search(folded)
+        if m:
+            return normalize_period(m.group(0))
+    return None
+
+def find_device(folded: str) -> Optional[str]:
+    hits = [(m.start(), device) for pattern, device in _DEVICE_RES for m in [pattern.search(folded)] if m]
+    return min(hits)[1] if hits else None
+
+def find_address_move(folded: str) -> Optional[bool]:
+    return True if _ADDRESS_MOVE_RE.search(folded) else None
+
+def extract_entities(ticket_text: str) -> dict:
+    """Entities payload for one ticket, from the text alone."""
+    folded = fold(ticket_text or "")
+    return {
+        "amount": find_amount(folded),
+        "invoice_period": find_invoice_period(folded),
+        "ticket_id": find_ticket_id(folded),
+        "device": find_device(folded),
+        "address_move": find_address_move(folded),
+    }
@@ -0,0 +1,51 @@
+import argparse
+import json
+from pathlib import Path
+
+from app.sinks import ParquetSink
+
+# Rebuild (or backfill) the Parquet dataset from outputs.jsonl.
+#
+#   python -m app.export_parquet                       # every run in logs/outputs.jsonl
+#   python -m app.export_parquet --run-id <run_id>     # just one run
+#
+# Use it for runs made before --parquet existed, or after a hard crash left a
+# run's part files unfinished. Existing parts of the exported runs are replaced.
+
+LOGS_DIR = Path("logs")  # same relative layout as app.main
+
+def export_jsonl(jsonl_path, root, run_id=None, row_group_size: int = 10_000) -> int:
+    root = Path(root)
+    n = 0
+    with open(jsonl_path, encoding="utf-8") as f, ParquetSink(root, row_group_size=row_group_size) as sink:
+        replaced = set()
+        for line in f:
+            try:
+                record = json.loads(line)
+                run_meta, payload = record["run_meta"], record["data"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue  # torn tail line
+            if run_id is not None and run_meta.get("run_id") != run_id:
+                continue
+            rid = str(run_meta["run_id"])
+            if rid not in replaced:
+                for old in (root / f"run_id={rid}").glob("*/part-*.parquet"):
+                    old.unlink()
+                replaced.add(rid)
+            sink.write_record(run_meta, payload)
+            n += 1
+    return n
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.export_parquet",
+                                     description="Write outputs.jsonl records into the Parquet dataset.")
+    parser.add_argument("--jsonl", default=str(LOGS_DIR / "outputs.jsonl"))
+    parser.add_argument("--out", default=str(LOGS_DIR / "outputs.parquet"))
+    parser.add_argument("--run-id", default=None, help="only export this run")
+    parser.add_argument("--row-group", type=int, default=10_000)
+    args = parser.parse_args(argv)
+    n = export_jsonl(args.jsonl, args.out, args.run_id, args.row_group)
+    print(f"Exported {n} records to {args.out}")
+
+if __name__ == "__main__":
+    main()
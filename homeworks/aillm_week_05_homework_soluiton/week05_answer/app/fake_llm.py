@@ -0,0 +1,136 @@
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import PrivateAttr
+
+from app.wire import compact
+
+# Offline stand-in for ChatGoogleGenerativeAI.
+# Answers with canned TicketExtraction JSON after a sampled delay, and can
+# inject throttling / server errors and low-confidence or unfixable answers, so
+# the whole pipeline (prompting, rate limiting, parsing, validation, cascade,
+# sinks) runs without network or quota.
+# Used by app.bench, or for any run via TICKET_FAKE_LLM='{"latency_ms": 300}'.
+
+CANNED_PAYLOADS = [
+    {"issue_type": "billing", "urgency": "high", "channel": "phone",
+     "entities": {"amount": 200.0, "invoice_period": None, "ticket_id": None, "device": None, "address_move": None},
+     "summary": "Customer reports a 200 TL overcharge on the bill.", "status_suggestion": "open"},
+    {"issue_type": "technical", "urgency": "medium", "channel": "chat",
+     "entities": {"amount": None, "invoice_period": None, "ticket_id": None, "device": "mobile app", "address_move": None},
+     "summary": "The app crashes right after opening.", "status_suggestion": "open"},
+    {"issue_type": "account", "urgency": "medium", "channel": "email",
+     "entities": {"amount": None, "invoice_period": None, "ticket_id": None, "device": None, "address_move": None},
+     "summary": "Account locked and the password reset link does not arrive.", "status_suggestion": "open"},
+    {"issue_type": "general", "urgency": "low", "channel": "unknown",
+     "entities": {"amount": None, "invoice_period": None, "ticket_id": "45721", "device": None, "address_move": None},
+     "summary": "Customer asks for a status update on ticket 45721.", "status_suggestion": "in_progress"},
+]
+
+_SECTION = re.compile(r"\[source_id=([^\]]+)\]\n(.*?)(?=\n\n\[source_id=|\n\nReturn JSON only\.|\Z)", re.S)
+
+class FakeLLMError(Exception):
+    pass
+
+class FakeTicketChatModel(BaseChatModel):
+    model: str = "fake-ticket-model"
+    latency_ms: float = 800.0      # median per call
+    latency_sigma: float = 0.5     # lognormal spread; 0 = fixed latency
+    per_ticket_ms: float = 0.0     # extra latency per ticket in a packed call
+    error_rate: float = 0.0        # share of calls that raise
+    throttle_share: float = 0.5    # share of those errors that look like a 429
+    output_tokens_per_ticket: Optional[int] = 60  # None = estimate from the answer (~4 chars/token)
+    decode_ms_per_token: float = 0.0  # extra latency per output token
+    low_confidence_rate: float = 0.0  # cascade tiers: share of answers with confidence 0.3 (else 0.9)
+    invalid_rate: float = 0.0      # share of answers with an enum value local repair can't fix
+    payloads: List[dict] = CANNED_PAYLOADS
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-ticket"
+
+    def _delay(self, n_tickets: int, output_tokens: int) -> float:
+        base = self.latency_ms / 1000.0
+        if self.latency_sigma > 0:
+            base *= self._rng.lognormvariate(0.0, self.latency_sigma)
+        extra_ms = max(0, n_tickets - 1) * self.per_ticket_ms + output_tokens * self.decode_ms_per_token
+        return base + extra_ms / 1000.0
+
+    def _maybe_fail(self):
+        if self._rng.random() < self.error_rate:
+            if self._rng.random() < self.throttle_share:
+                raise FakeLLMError("429 RESOURCE_EXHAUSTED: fake quota exceeded")
+            raise FakeLLMError("503 Service Unavailable (fake)")
+
+    def _payload_for(self, text: str) -> dict:
+        # stable per ticket text, so cached/deduped runs see identical answers
+        return json.loads(json.dumps(self.payloads[zlib.crc32(text.encode("utf-8")) % len(self.payloads)]))
+
+    def _answer(self, messages: List[BaseMessage]):
+        human = messages[-1].content if messages else ""
+        human = human if isinstance(human, str) else str(human)
+        sections = _SECTION.findall(human)
+        system = messages[0].content if messages and isinstance(messages[0].content, str) else ""
+        # --lazy-summary phase one leaves out summary, --hybrid-entities leaves out entities
+        omitted = [field for field in ("summary", "entities") if field not in system]
+        if sections and "issue_type" not in system:  # --lazy-summary phase two
+            body = {"items": [{"source_id": sid, "summary": self._payload_for(text)["summary"]}
+                              for sid, text in sections]}
+        elif sections:  # packed prompt
+            body = {"items": [dict(self._payload_for(text), source_id=sid) for sid, text in sections]}
+            for item in body["items"]:
+                for field in omitted:
+                    del item[field]
+        else:
+            body = self._payload_for(human)
+            if self._rng.random() < self.invalid_rate:
+                body["urgency"] = "whenever"
+            for field in omitted:
+                del body[field]
+            if "confidence" in system:  # a cascade tier's prompt
+                body["confidence"] = 0.3 if self._rng.random() < self.low_confidence_rate else 0.9
+            if "short keys" in system:  # --wire compact
+                body = compact(body)
+        n = max(1, len(sections))
+        content = json.dumps(body, ensure_ascii=False)
+        prompt_chars = sum(len(m.content) for m in messages if isinstance(m.content, str))
+        output_tokens = (len(content) // 4 if self.output_tokens_per_ticket is None
+                         else self.output_tokens_per_ticket * n)
+        usage = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": output_tokens,
+            "total_tokens": prompt_chars // 4 + output_tokens,
+        }
+        message = AIMessage(content=content, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)]), n, output_tokens
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, n, output_tokens = self._answer(messages)
+        time.sleep(self._delay(n, output_tokens))
+        self._maybe_fail()
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, n, output_tokens = self._answer(messages)
+        await asyncio.sleep(self._delay(n, output_tokens))
+        self._maybe_fail()
+        return result
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        # same `model | parser` shape as the real client (json_schema method)
+        return self | RunnableLambda(lambda message: schema.model_validate_json(message.content))
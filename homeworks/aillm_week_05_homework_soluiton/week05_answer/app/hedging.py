@@ -0,0 +1,117 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from app.metrics import metrics
+
+# Hedged requests for the async extraction path ("The Tail at Scale").
+# A call that is still running once it passes the observed p95 latency gets a
+# duplicate; the first attempt that returns a valid result wins. Hedges are
+# capped at `budget` x calls, so at the default 5% the extra spend is bounded no
+# matter how slow the backend gets.
+#
+# Two stages go into the run metrics: `llm_call` (latency the caller saw) and
+# `llm_call_unhedged` (latency of the first attempt alone, measured to the end
+# even when the hedge won), so their p99s show what the extra calls bought.
+
+class HedgePolicy:
+    def __init__(self, quantile: float = 0.95, budget: float = 0.05, min_samples: int = 20,
+                 window: int = 512, min_delay: float = 0.05):
+        self.quantile = quantile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies = deque(maxlen=window)  # first-attempt latencies, seconds
+        self._delay: Optional[float] = None
+        self._since_recompute = 0
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little history."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        if self._delay is None or self._since_recompute >= 16:
+            ordered = sorted(self._latencies)
+            idx = max(0, math.ceil(self.quantile * len(ordered)) - 1)
+            self._delay = max(self.min_delay, ordered[idx])
+            self._since_recompute = 0
+        return self._delay
+
+    def _observe_first(self, seconds: float):
+        self._latencies.append(seconds)
+        self._since_recompute += 1
+        metrics.observe("llm_call_unhedged", seconds)
+
+    def _take_budget(self) -> bool:
+        if self.hedges + 1 > self.budget * self.calls:
+            self.over_budget += 1
+            return False
+        self.hedges += 1
+        return True
+
+    async def run(self, attempt: Callable[[], Awaitable], accept: Optional[Callable] = None):
+        """Await `attempt()`, hedging it once if it outlives the p95 delay.
+
+        An attempt that raises, or whose result fails `accept`, does not win;
+        if no attempt is accepted the last completed result (or error) is used.
+        """
+        self.calls += 1
+        started = time.perf_counter()
+        first = asyncio.ensure_future(attempt())
+        try:
+            await asyncio.wait({first}, timeout=self.delay())
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if first.done() or not self._take_budget():
+            try:
+                return await first
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.observe("llm_call", elapsed)
+                self._observe_first(elapsed)
+
+        second = asyncio.ensure_future(attempt())
+        pending = {first, second}
+        fallback = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is first:
+                        self._observe_first(time.perf_counter() - started)
+                    fallback = task
+                    if task.exception() is None and (accept is None or accept(task.result())):
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            return fallback.result()
+        except asyncio.CancelledError:
+            for task in pending:
+                task.cancel()
+            pending = set()
+            raise
+        finally:
+            metrics.observe("llm_call", time.perf_counter() - started)
+            # the loser keeps running: the provider is doing (and billing) the work
+            # anyway, and letting it finish keeps its rate-limiter slot honest and
+            # gives the real first-attempt latency for the unhedged p99
+            for task in pending:
+                task.add_done_callback(self._loser_done(task is first, started))
+
+    def _loser_done(self, is_first: bool, started: float):
+        def done(task: asyncio.Task):
+            if not task.cancelled():
+                task.exception()  # retrieved, so asyncio does not log it
+                if is_first:
+                    self._observe_first(time.perf_counter() - started)
+        return done
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                "over_budget": self.over_budget}
@@ -0,0 +1,78 @@
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Import-time report for a CLI invocation, from `python -X importtime`.
+#
+#   python -m app.importtime                                  # python -m app.main --help
+#   python -m app.importtime -m app.service --help
+#   python -m app.importtime --runs 3 -m app.main tickets.csv --cache
+#   python -m app.importtime -- some_script.py --flag
+#
+# Prints the wall time of the whole invocation (median of --runs), the
+# third-party packages it imported ranked by self time, and the slowest
+# imports by cumulative time. A package that shows up for `--help` is one
+# that app.lazy should be deferring.
+
+DEFAULT_COMMAND = ["-m", "app.main", "--help"]
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def parse_importtime(stderr: str):
+    """[(module, self_us, cumulative_us, depth), ...] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    return rows
+
+def _run(command, importtime: bool):
+    flags = ["-X", "importtime"] if importtime else []
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, *flags, *command], capture_output=True, text=True)
+    return time.perf_counter() - started, proc
+
+def report(command, runs: int = 5, top: int = 15):
+    walls = [_run(command, importtime=False)[0] for _ in range(runs)]
+    _, proc = _run(command, importtime=True)
+    rows = parse_importtime(proc.stderr)
+
+    by_package = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        by_package[module.split(".")[0]] += self_us
+    stdlib = set(sys.stdlib_module_names) | {"encodings", "site", "_frozen_importlib_external"}
+
+    print(f"command: python {' '.join(command)}")
+    print(f"wall:    {1000 * statistics.median(walls):.0f} ms median of {runs} runs "
+          f"(min {1000 * min(walls):.0f} ms)")
+    print(f"imports: {len(rows)} modules, {sum(r[1] for r in rows) / 1000:.1f} ms self time")
+
+    third_party = sorted(((us, pkg) for pkg, us in by_package.items() if pkg not in stdlib), reverse=True)
+    print("\nthird-party packages by self time (ms):")
+    for us, pkg in third_party[:top] or [(0, "(none)")]:
+        print(f"  {us / 1000:9.1f}  {pkg}")
+
+    print("\nslowest imports by cumulative time (ms):")
+    for module, self_us, cum_us, depth in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"  {cum_us / 1000:9.1f}  {'  ' * min(depth, 8)}{module}")
+    return {"wall_s": statistics.median(walls), "modules": len(rows),
+            "packages": {pkg: us for us, pkg in third_party}}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.importtime",
+                                     description="Import-time report for a python command line.")
+    parser.add_argument("--runs", type=int, default=5, help="wall-time samples (default: 5)")
+    parser.add_argument("--top", type=int, default=15, help="rows per table (default: 15)")
+    # everything from the first -m / -c (or after --) is the command to measure
+    argv = list(sys.argv[1:] if argv is None else argv)
+    split = next((i for i, a in enumerate(argv) if a in ("-m", "-c", "--")), len(argv))
+    args = parser.parse_args(argv[:split])
+    command = argv[split + 1:] if argv[split:split + 1] == ["--"] else argv[split:]
+    report(command or DEFAULT_COMMAND, runs=args.runs, top=args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import importlib.util
+import sys
+
+# Deferred imports for the heavy dependencies (pandas, numpy, pyarrow, LangChain
+# and the app modules built on them). lazy_import() hands back the module right
+# away and only runs it on first attribute access, so `--help`, usage errors and
+# runs that never reach a code path don't pay for its libraries.
+# `python -m app.importtime` shows what an invocation still imports.
+
+def lazy_import(name: str):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def optional_import(name: str):
+    """lazy_import(name), or None when the package is not installed."""
+    try:
+        return lazy_import(name)
+    except ModuleNotFoundError:
+        return None
@@ -1,14 +1,25 @@
 import os
-import re
-from typing import Any
+import json
+import hashlib
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 load_dotenv()  # ensure GOOGLE_API_KEY is present before LLM init
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import BaseMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import Runnable
-from app.models import TicketExtraction
+from langchain_core.runnables import Runnable, RunnableSequence
+from pydantic import ValidationError
+from app.models import TicketExtraction, PackedTicketBatch, SummaryBatch, reduced_model, scored_model
+from app.ratelimit import RateLimiter
+from app.hedging import HedgePolicy
+from app.entities import PATTERNS_HASH, extract_entities
+from app.metrics import metrics, stage
+from app.postprocess import normalize_entities
+from app.repair import RepairError, extract_json, repair_payload
+from app.wire import CompactTicketExtraction, expand
 
 SYSTEM = (
     "You are a strict information extractor. "
@@ -25,28 +36,565 @@ SYSTEM = (
     "Do NOT add extra fields. Return JSON only."
 )
 
+HUMAN = "Ticket text:\n{ticket_text}\n\nReturn JSON only."
+
 prompt = ChatPromptTemplate.from_messages([
     ("system", SYSTEM),
-    ("human", "Ticket text:\n{ticket_text}\n\nReturn JSON only.")
+    ("human", HUMAN)
+])
+
+# --wire compact: same fields under short keys (app.wire), unknown entities left out
+COMPACT_SYSTEM = (
+    "You are a strict information extractor. "
+    "Return JSON with EXACTLY these short keys: "
+    "it (issue_type), u (urgency), c (channel), e (entities), s (summary), st (status_suggestion). "
+    "Allowed enums: "
+    "it: {{billing, technical, account, general}}; "
+    "u: {{low, medium, high}}; "
+    "c: {{phone, email, chat, unknown}}; "
+    "st: {{open, in_progress, resolved}}. "
+    "e is an object that may contain: a (amount, number), p (invoice_period, string), "
+    "t (ticket_id, string), d (device, string), m (address_move, boolean). "
+    "Leave out any entity that is unknown; at the top level pick the closest enum. "
+    "Do NOT add extra fields. Return JSON only."
+)
+
+compact_prompt = ChatPromptTemplate.from_messages([
+    ("system", COMPACT_SYSTEM),
+    ("human", HUMAN)
 ])
 
-# Don't hardcode the key; rely on env (GOOGLE_API_KEY) which is already loaded above.
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
+# --lazy-summary / --hybrid-entities: the same prompts without the fields filled in locally
+ENTITIES_SPEC = (
+    "entities must contain: amount (number|null), invoice_period (string|null), "
+    "ticket_id (string|null), device (string|null), address_move (boolean|null). "
+)
 
-# Enforce Pydantic-validated structured output
-chain: Runnable = prompt | llm.with_structured_output(TicketExtraction)
+def _omit_fields(system: str, omit) -> str:
+    if "summary" in omit:
+        system = system.replace("summary, ", "")
+    if "entities" in omit:
+        system = (system.replace("entities, ", "").replace(ENTITIES_SPEC, "")
+                  .replace("use null for nested fields or pick", "pick"))
+    return system
 
-def _normalize_amount_like(value: Any):
-    if value is None:
-        return None
-    if isinstance(value, (int, float)):
-        return float(value)
-    if isinstance(value, str):
-        m = re.search(r"[-+]?\d+(?:\.\d+)?", value.replace(",", ""))
-        return float(m.group(0)) if m else None
-    return None
+MODEL_NAME = "gemini-2.5-flash"
 
-def extract_ticket(ticket_text: str) -> TicketExtraction:
-    result: TicketExtraction = chain.invoke({"ticket_text": ticket_text})
-    result.entities.amount = _normalize_amount_like(result.entities.amount)
+def _make_llm(model_name: str = MODEL_NAME):
+    # TICKET_FAKE_LLM='{"latency_ms": 300, "error_rate": 0.02}' runs everything
+    # offline against app.fake_llm (also picked up by --shards worker processes);
+    # "tiers": {"<model>": {...}} overrides the settings per cascade tier
+    fake = os.getenv("TICKET_FAKE_LLM")
+    if fake:
+        from app.fake_llm import FakeTicketChatModel
+        config = json.loads(fake) if fake.strip().startswith("{") else {}
+        config.update(config.pop("tiers", {}).get(model_name, {}))
+        return FakeTicketChatModel(**{"model": model_name, **config})
+    # the Gemini client package alone takes ~1 s to import, so only when a call needs it
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # Don't hardcode the key; rely on env (GOOGLE_API_KEY) which is already loaded above.
+    return ChatGoogleGenerativeAI(model=model_name)
+
+# Identify what produced a payload, so app.cache can tell stale entries apart.
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def model_key(models: str) -> str:
+    """The model part of cache namespaces: simulated runs (TICKET_FAKE_LLM) get their own,
+    so canned answers are never served as if the real model had produced them."""
+    fake = os.getenv("TICKET_FAKE_LLM")
+    return f"{models}+fake:{_hash(fake)}" if fake else models
+
+PROMPT_HASH = _hash(SYSTEM + HUMAN)
+COMPACT_PROMPT_HASH = _hash(COMPACT_SYSTEM + HUMAN)
+SCHEMA_VERSION = hashlib.sha256(
+    json.dumps(TicketExtraction.model_json_schema(), sort_keys=True).encode("utf-8")
+).hexdigest()[:16]
+
+# The chat model and the chains on top of it (LLM_ATTRS) are built on first
+# use by ensure_llm(), not at import, so CLI startup and cached/pre-filtered
+# runs skip the client.
+LLM_ATTRS = ("llm", "structured_llm", "chain", "bound_llm", "compact_llm",
+             "packed_llm", "packed_chain", "summary_llm")
+
+def ensure_llm():
+    if "llm" not in globals():
+        set_llm(_make_llm())
+
+def __getattr__(name):
+    # module attribute access (llm_chain.chain) builds the model too
+    if name in LLM_ATTRS:
+        ensure_llm()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _bound_model(structured: Runnable) -> Runnable:
+    # with_structured_output() returns `schema-bound llm | parser`. extract_ticket
+    # runs the two halves itself so parsing and validation can be timed on their own.
+    return structured.first if isinstance(structured, RunnableSequence) else structured
+
+# Optional client-side backpressure, installed by the runner via configure_rate_limiter()
+rate_limiter: Optional[RateLimiter] = None
+OUTPUT_TOKEN_BUDGET = 200  # rough size of one TicketExtraction answer
+
+def configure_rate_limiter(limiter: Optional[RateLimiter]):
+    global rate_limiter
+    rate_limiter = limiter
+
+# Optional hedging of slow async calls, installed via configure_hedging()
+hedge_policy: Optional[HedgePolicy] = None
+
+def configure_hedging(policy: Optional[HedgePolicy]):
+    global hedge_policy
+    hedge_policy = policy
+
+# Wire format of single-ticket calls, set via configure_wire(): "full" or "compact"
+wire_format = "full"
+
+def configure_wire(fmt: str):
+    global wire_format
+    if fmt not in ("full", "compact"):
+        raise ValueError(f"unknown wire format {fmt!r}")
+    wire_format = fmt
+
+# Two-phase mode, set via configure_summary(): calls leave summary out (it is
+# validated as "") and summarize() fills it in later for the tickets that need it
+deferred_summary = False
+
+def configure_summary(deferred: bool):
+    global deferred_summary
+    deferred_summary = deferred
+
+# Hybrid mode, set via configure_entities(): calls leave entities out and
+# app.entities fills them from the ticket text before validation
+local_entities = False
+
+def configure_entities(local: bool):
+    global local_entities
+    local_entities = local
+
+def omitted_fields() -> Tuple[str, ...]:
+    """TicketExtraction fields the model is currently not asked for."""
+    return tuple(field for field, on in (("entities", local_entities), ("summary", deferred_summary)) if on)
+
+def prompt_hash() -> str:
+    """Hash of the single-ticket prompt in use (plus the extractors that fill omitted entities)."""
+    omit = omitted_fields()
+    if not omit:
+        return COMPACT_PROMPT_HASH if wire_format == "compact" else PROMPT_HASH
+    digest = _hash(_omit_fields(SYSTEM, omit) + HUMAN)
+    return f"{digest}:{PATTERNS_HASH}" if local_entities else digest
+
+# (packed, omitted fields) -> (prompt, schema-bound model); emptied by set_llm()
+_reduced_chains: Dict[Tuple[bool, Tuple[str, ...]], Tuple[ChatPromptTemplate, Runnable]] = {}
+
+def _reduced_chain(packed: bool):
+    omit = omitted_fields()
+    if (packed, omit) not in _reduced_chains:
+        system, human = (PACKED_SYSTEM, PACKED_HUMAN) if packed else (SYSTEM, HUMAN)
+        chat_prompt = ChatPromptTemplate.from_messages([
+            ("system", _omit_fields(system, omit)),
+            ("human", human)
+        ])
+        model = _bound_model(llm.with_structured_output(reduced_model(omit, packed)))
+        _reduced_chains[packed, omit] = (chat_prompt, model)
+    return _reduced_chains[packed, omit]
+
+def _single_chain():
+    ensure_llm()
+    if omitted_fields():
+        return _reduced_chain(packed=False)
+    return (compact_prompt, compact_llm) if wire_format == "compact" else (prompt, bound_llm)
+
+def _packed_chain():
+    ensure_llm()
+    return _reduced_chain(packed=True) if omitted_fields() else (packed_prompt, packed_llm)
+
+async def _hedged(attempt, accept=None):
+    return await (hedge_policy.run(attempt, accept) if hedge_policy else attempt())
+
+def estimate_tokens(*texts: str) -> int:
+    # ~4 chars per token is close enough for budgeting
+    return (len(SYSTEM) + sum(len(t) for t in texts)) // 4 + OUTPUT_TOKEN_BUDGET * len(texts)
+
+def _slot(*texts: str):
+    return rate_limiter.slot(estimate_tokens(*texts)) if rate_limiter else nullcontext()
+
+def _aslot(*texts: str):
+    return rate_limiter.aslot(estimate_tokens(*texts)) if rate_limiter else nullcontext()
+
+def _message_text(content) -> str:
+    if isinstance(content, list):  # multi-part content
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return content or ""
+
+def _payload_from_message(raw) -> Any:
+    """The JSON object the model produced, whichever structured-output method was used."""
+    if not isinstance(raw, BaseMessage):
+        # already parsed (structured runnable that wasn't `llm | parser`)
+        return raw.model_dump() if hasattr(raw, "model_dump") else raw
+    # function_calling puts the payload in tool call args, json_schema in the message content
+    tool_calls = getattr(raw, "tool_calls", None) or []
+    if tool_calls:
+        return tool_calls[0].get("args", {})
+    text = _message_text(getattr(raw, "content", "")).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # fenced, or wrapped in prose
+        return extract_json(text)
+
+def _validate(data) -> TicketExtraction:
+    """Validate one raw extraction; near-misses are repaired locally before giving up."""
+    try:
+        with stage("validate"):
+            return TicketExtraction.model_validate(data)
+    except ValidationError:
+        pass
+    with stage("repair"):
+        try:
+            result = TicketExtraction.model_validate(repair_payload(data))
+        except ValidationError as e:
+            metrics.count("repair_failed")
+            raise RepairError(f"invalid model output, local repair failed: {e}") from e
+    metrics.count("repaired")
     return result
+
+def _finish(raw, ticket_text: str = "") -> TicketExtraction:
+    metrics.add_usage(raw)
+    with stage("parse"):
+        data = _payload_from_message(raw)
+        if wire_format == "compact":
+            data = expand(data)
+        if deferred_summary and isinstance(data, dict):
+            data.setdefault("summary", "")
+    if local_entities and isinstance(data, dict):
+        with stage("entities"):
+            data["entities"] = extract_entities(ticket_text)
+    # before validation: "1.250,50 TL" would not pass as a float
+    with stage("normalize"):
+        normalize_entities([data])
+    return _validate(data)
+
+def extract_ticket(ticket_text: str) -> TicketExtraction:
+    if cascade:
+        return _cascade_extract(ticket_text)
+    chat_prompt, model = _single_chain()
+    with stage("format"):
+        messages = chat_prompt.invoke({"ticket_text": ticket_text})
+    with _slot(ticket_text), stage("network"):
+        raw = model.invoke(messages)
+    return _finish(raw, ticket_text)
+
+async def aextract_ticket(ticket_text: str) -> TicketExtraction:
+    # async twin of extract_ticket, used by the concurrent runner
+    if cascade:
+        return await _hedged(lambda: _acascade_extract(ticket_text))
+    chat_prompt, model = _single_chain()
+    with stage("format"):
+        messages = chat_prompt.invoke({"ticket_text": ticket_text})
+    async def attempt():
+        async with _aslot(ticket_text):
+            with stage("network"):
+                raw = await model.ainvoke(messages)
+        return _finish(raw, ticket_text)
+    return await _hedged(attempt)
+
+# --- model cascade: cheaper tiers first, stronger ones only when needed ---
+# Every tier but the last also returns `confidence` (0-1). A tier's answer is
+# kept when it validates (after local repair) and confidence >= min_confidence.
+# Otherwise the ticket moves on to the next tier, and so does a ticket whose
+# call to a cheaper tier failed. The last tier is an ordinary call: its answer
+# is final and its errors go to the runner's retry logic. Latency per tier goes
+# into the `tier:<model>` stage; counts come from cascade_stats().
+SCORED_SYSTEM = SYSTEM.replace(
+    "summary, status_suggestion. ", "summary, status_suggestion, confidence. "
+).replace(
+    "Do NOT add extra fields.",
+    "confidence is a number from 0 to 1: how sure you are that every other field is right. "
+    "Do NOT add extra fields.",
+)
+
+class CascadeTier:
+    def __init__(self, name: str, final: bool):
+        self.name = name
+        self.final = final
+        self._prompt: Optional[ChatPromptTemplate] = None
+        self._bound: Optional[Runnable] = None
+        self.calls = 0
+        self.accepted = 0
+        self.low_confidence = 0
+        self.invalid = 0
+        self.errors = 0
+
+    # with --hybrid-entities every tier is asked for everything but the entities,
+    # like single calls are; finish() fills them in from the ticket text
+    def _chain(self):
+        if self.final and self.name == MODEL_NAME:
+            # the usual chain, so set_llm() swaps it too
+            ensure_llm()
+            return _reduced_chain(packed=False) if local_entities else (prompt, bound_llm)
+        if self._bound is None:
+            omit = ("entities",) if local_entities else ()
+            system = SYSTEM if self.final else SCORED_SYSTEM
+            self._prompt = ChatPromptTemplate.from_messages([
+                ("system", _omit_fields(system, omit)),
+                ("human", HUMAN)
+            ])
+            if self.final:
+                schema = reduced_model(omit) if omit else TicketExtraction
+            else:
+                schema = scored_model(omit)
+            self._bound = _bound_model(_make_llm(self.name).with_structured_output(schema))
+        return self._prompt, self._bound
+
+    @property
+    def prompt(self) -> ChatPromptTemplate:
+        return self._chain()[0]
+
+    @property
+    def bound(self) -> Runnable:
+        return self._chain()[1]
+
+    def finish(self, raw, ticket_text: str = "") -> Optional[TicketExtraction]:
+        """The tier's answer, or None to escalate; the last tier raises instead."""
+        if self.final:
+            try:
+                result = _finish(raw, ticket_text)
+            except (TypeError, ValueError):
+                self.invalid += 1
+                raise
+            self.accepted += 1
+            return result
+        metrics.add_usage(raw)
+        try:
+            with stage("parse"):
+                data = _payload_from_message(raw)
+            confidence = data.pop("confidence", None) if isinstance(data, dict) else None
+            if local_entities and isinstance(data, dict):
+                with stage("entities"):
+                    data["entities"] = extract_entities(ticket_text)
+            with stage("normalize"):
+                normalize_entities([data])
+            result = _validate(data)
+        except (TypeError, ValueError):  # JSONDecodeError and RepairError included
+            self.invalid += 1
+            return None
+        if not isinstance(confidence, (int, float)) or confidence < cascade_min_confidence:
+            self.low_confidence += 1
+            return None
+        self.accepted += 1
+        return result
+
+    def failed(self, e: Exception):
+        self.errors += 1
+        if self.final:
+            raise e
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "accepted": self.accepted, "low_confidence": self.low_confidence,
+                "invalid": self.invalid, "errors": self.errors}
+
+# installed by the runner via configure_cascade(); empty = no cascade
+cascade: List[CascadeTier] = []
+cascade_min_confidence = 0.7
+
+def configure_cascade(tiers: Optional[List[str]], min_confidence: float = 0.7):
+    global cascade, cascade_min_confidence
+    tiers = list(tiers or [])
+    cascade = [CascadeTier(name, final=i == len(tiers) - 1) for i, name in enumerate(tiers)]
+    cascade_min_confidence = min_confidence
+
+def cascade_stats() -> Dict[str, dict]:
+    return {tier.name: tier.stats() for tier in cascade}
+
+def _cascade_extract(ticket_text: str) -> TicketExtraction:
+    for tier in cascade:
+        with stage("format"):
+            messages = tier.prompt.invoke({"ticket_text": ticket_text})
+        tier.calls += 1
+        started = time.perf_counter()
+        try:
+            with _slot(ticket_text), stage("network"):
+                raw = tier.bound.invoke(messages)
+        except Exception as e:
+            tier.failed(e)
+            continue
+        finally:
+            metrics.observe(f"tier:{tier.name}", time.perf_counter() - started)
+        result = tier.finish(raw, ticket_text)
+        if result is not None:
+            return result
+
+async def _acascade_extract(ticket_text: str) -> TicketExtraction:
+    for tier in cascade:
+        with stage("format"):
+            messages = tier.prompt.invoke({"ticket_text": ticket_text})
+        tier.calls += 1
+        started = time.perf_counter()
+        try:
+            async with _aslot(ticket_text):
+                with stage("network"):
+                    raw = await tier.bound.ainvoke(messages)
+        except Exception as e:
+            tier.failed(e)
+            continue
+        finally:
+            metrics.observe(f"tier:{tier.name}", time.perf_counter() - started)
+        result = tier.finish(raw, ticket_text)
+        if result is not None:
+            return result
+
+# --- packed mode: N tickets per call so SYSTEM is paid once per batch ---
+PACKED_SYSTEM = (
+    "You are a strict information extractor. "
+    "You will receive several support tickets, each introduced by a [source_id=...] line. "
+    "Return JSON with a single key `items`: a list with exactly one object per ticket. "
+    "Each object has EXACTLY these keys: "
+    "source_id, issue_type, urgency, channel, entities, summary, status_suggestion. "
+    "Copy source_id verbatim from the ticket header. "
+    "Allowed enums: "
+    "issue_type: {{billing, technical, account, general}}; "
+    "urgency: {{low, medium, high}}; "
+    "channel: {{phone, email, chat, unknown}}; "
+    "status_suggestion: {{open, in_progress, resolved}}. "
+    "entities must contain: amount (number|null), invoice_period (string|null), "
+    "ticket_id (string|null), device (string|null), address_move (boolean|null). "
+    "If something is unknown, use null for nested fields or pick the closest enum at the top level. "
+    "Do NOT add extra fields. Return JSON only."
+)
+
+PACKED_HUMAN = "Tickets:\n{tickets}\n\nReturn JSON only."
+
+packed_prompt = ChatPromptTemplate.from_messages([
+    ("system", PACKED_SYSTEM),
+    ("human", PACKED_HUMAN)
+])
+
+def _format_packed(tickets: List[Tuple[str, str]]) -> str:
+    return "\n\n".join(f"[source_id={sid}]\n{text}" for sid, text in tickets)
+
+def _raw_items(raw) -> List[Any]:
+    try:
+        data = _payload_from_message(raw)
+    except (TypeError, ValueError):  # JSONDecodeError and RepairError included
+        return []
+    items = data.get("items") if isinstance(data, dict) else None
+    return items if isinstance(items, list) else []
+
+def _unpack(raw, tickets: List[Tuple[str, str]]):
+    texts = dict(tickets)
+    results: Dict[str, TicketExtraction] = {}
+
+    metrics.add_usage(raw)
+    with stage("parse"):
+        candidates = _raw_items(raw)
+    with stage("normalize"):
+        normalize_entities(candidates)
+
+    for item in candidates:
+        if not isinstance(item, dict):
+            continue
+        if deferred_summary:
+            item.setdefault("summary", "")
+        sid = str(item.pop("source_id", ""))
+        if sid not in texts or sid in results:
+            continue
+        if local_entities:
+            with stage("entities"):
+                item["entities"] = extract_entities(texts[sid])
+        try:
+            results[sid] = _validate(item)
+        except RepairError:
+            continue
+
+    # anything missing or invalid goes back to the caller to be sent on its own
+    leftovers = [(sid, text) for sid, text in tickets if sid not in results]
+    return results, leftovers
+
+def extract_packed(tickets: List[Tuple[str, str]]):
+    """Extract several (source_id, ticket_text) pairs in one call.
+
+    Returns (results keyed by source_id, leftover tickets to retry one by one).
+    """
+    chat_prompt, model = _packed_chain()
+    with stage("format"):
+        messages = chat_prompt.invoke({"tickets": _format_packed(tickets)})
+    with _slot(*(text for _, text in tickets)), stage("network"):
+        raw = model.invoke(messages)
+    return _unpack(raw, tickets)
+
+async def aextract_packed(tickets: List[Tuple[str, str]]):
+    chat_prompt, model = _packed_chain()
+    with stage("format"):
+        messages = chat_prompt.invoke({"tickets": _format_packed(tickets)})
+    async def attempt():
+        async with _aslot(*(text for _, text in tickets)):
+            with stage("network"):
+                raw = await model.ainvoke(messages)
+        return _unpack(raw, tickets)
+    # a hedge only wins outright if it has every ticket; otherwise the last answer is used
+    return await _hedged(attempt, accept=lambda unpacked: not unpacked[1])
+
+# --- lazy summaries (--lazy-summary phase two): one call per batch of tickets ---
+SUMMARY_SYSTEM = (
+    "You write short summaries of support tickets. "
+    "You will receive several support tickets, each introduced by a [source_id=...] line. "
+    "Return JSON with a single key `items`: a list with exactly one object per ticket. "
+    "Each object has EXACTLY these keys: source_id, summary. "
+    "Copy source_id verbatim from the ticket header. "
+    "summary is one sentence saying what the customer needs. "
+    "Do NOT add extra fields. Return JSON only."
+)
+
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", SUMMARY_SYSTEM),
+    ("human", PACKED_HUMAN)
+])
+
+def _summaries(raw, tickets: List[Tuple[str, str]]) -> Dict[str, str]:
+    wanted = {sid for sid, _ in tickets}
+    metrics.add_usage(raw)
+    with stage("parse"):
+        items = _raw_items(raw)
+    out = {}
+    for item in items:
+        if isinstance(item, dict) and str(item.get("source_id")) in wanted:
+            summary = item.get("summary")
+            if isinstance(summary, str) and summary.strip():
+                out[str(item["source_id"])] = summary.strip()
+    return out
+
+def summarize(tickets: List[Tuple[str, str]]) -> Dict[str, str]:
+    """Summaries for (source_id, ticket_text) pairs, keyed by source_id; missing ones are left out."""
+    ensure_llm()
+    with stage("format"):
+        messages = summary_prompt.invoke({"tickets": _format_packed(tickets)})
+    with _slot(*(text for _, text in tickets)), stage("summary"):
+        raw = summary_llm.invoke(messages)
+    return _summaries(raw, tickets)
+
+async def asummarize(tickets: List[Tuple[str, str]]) -> Dict[str, str]:
+    ensure_llm()
+    with stage("format"):
+        messages = summary_prompt.invoke({"tickets": _format_packed(tickets)})
+    async with _aslot(*(text for _, text in tickets)):
+        with stage("summary"):
+            raw = await summary_llm.ainvoke(messages)
+    return _summaries(raw, tickets)
+
+def set_llm(model):
+    """Swap the chat model behind every chain, e.g. for app.fake_llm in benchmarks."""
+    global llm, structured_llm, chain, bound_llm, compact_llm, packed_llm, packed_chain, summary_llm
+    llm = model
+    # Enforce Pydantic-validated structured output
+    structured_llm = llm.with_structured_output(TicketExtraction)
+    chain = prompt | structured_llm
+    bound_llm = _bound_model(structured_llm)
+    compact_llm = _bound_model(llm.with_structured_output(CompactTicketExtraction))
+    # only the schema-bound model: items are validated one by one in _unpack, so a
+    # single bad item doesn't throw away the whole batch
+    packed_llm = _bound_model(llm.with_structured_output(PackedTicketBatch))
+    packed_chain = packed_prompt | packed_llm
+    summary_llm = _bound_model(llm.with_structured_output(SummaryBatch))
+    _reduced_chains.clear()
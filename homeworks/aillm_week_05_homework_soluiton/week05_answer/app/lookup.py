@@ -0,0 +1,117 @@
+import argparse
+import json
+import mmap
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app.offsets import OffsetIndex, record_key
+
+# Point lookups in outputs.jsonl through its offset index (app.offsets).
+#
+#   python -m app.lookup CUST-123                    # the most recent record for CUST-123
+#   python -m app.lookup CUST-123 --run <run_id>     # its record in one run
+#   python -m app.lookup CUST-123 CUST-456 --all     # every run's record, oldest first
+#   python -m app.lookup --stats                     # records, runs and bytes indexed
+#
+# The index first catches up on anything appended since it was last updated,
+# then each lookup is one index probe plus a slice of the memory-mapped file,
+# so its cost does not grow with the log. A slice that doesn't hold the
+# expected record (the file was rewritten under the index) triggers one
+# re-sync before the record is reported missing.
+
+LOGS_DIR = Path("logs")  # same relative layout as app.main
+
+class OutputsReader:
+    """outputs.jsonl mapped read-only; records are read by (offset, length)."""
+
+    def __init__(self, jsonl_path, index: Optional[OffsetIndex] = None):
+        self.path = Path(jsonl_path)
+        self.index = index or OffsetIndex(self.path)
+        self.f = open(self.path, "rb")
+        self.mm = None
+        self._remap()
+
+    def _remap(self):
+        if self.mm is not None:
+            self.mm.close()
+        size = self.path.stat().st_size
+        # mmap can't map an empty file
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def _read(self, run_id: str, source_id: str, offset: int, length: int) -> Optional[dict]:
+        if self.mm is None or offset + length > len(self.mm):
+            self._remap()  # the file grew since it was mapped
+        if self.mm is None or offset + length > len(self.mm):
+            return None
+        line = self.mm[offset:offset + length]
+        if record_key(line) != (run_id, source_id):
+            return None
+        return json.loads(line)
+
+    def get(self, source_id: str, run_id: Optional[str] = None) -> Optional[dict]:
+        """source_id's record in run_id, or its most recent one."""
+        for attempt in range(2):
+            hit = self.index.find(source_id, run_id)
+            record = self._read(hit[0], source_id, hit[1], hit[2]) if hit else None
+            if record is not None or attempt:
+                return record
+            self.index.sync()
+            self._remap()
+
+    def get_all(self, source_id: str) -> List[dict]:
+        records = [self._read(run_id, source_id, offset, length)
+                   for run_id, offset, length in self.index.find_all(source_id)]
+        if None in records:
+            self.index.sync()
+            self._remap()
+            records = [self._read(run_id, source_id, offset, length)
+                       for run_id, offset, length in self.index.find_all(source_id)]
+        return [r for r in records if r is not None]
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.f.close()
+        self.index.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.lookup",
+                                     description="Look up extraction records in outputs.jsonl by source_id.")
+    parser.add_argument("source_ids", nargs="*", metavar="SOURCE_ID")
+    parser.add_argument("--jsonl", default=str(LOGS_DIR / "outputs.jsonl"))
+    parser.add_argument("--run", default=None, metavar="RUN_ID", help="the record from this run")
+    parser.add_argument("--all", action="store_true", help="the record from every run, oldest first")
+    parser.add_argument("--stats", action="store_true", help="print index statistics")
+    args = parser.parse_args(argv)
+    if not Path(args.jsonl).exists():
+        print(f"{args.jsonl} does not exist", file=sys.stderr)
+        raise SystemExit(1)
+
+    index = OffsetIndex(args.jsonl)
+    started = time.perf_counter()
+    synced = index.sync()
+    if args.stats or not args.source_ids:
+        stats = index.stats()
+        print(f"{args.jsonl}: {stats['records']} records from {stats['runs']} runs, "
+              f"{stats['indexed_bytes']} bytes indexed ({synced} lines added now, "
+              f"{1000 * (time.perf_counter() - started):.1f} ms)", file=sys.stderr)
+
+    reader = OutputsReader(args.jsonl, index)
+    missing = 0
+    try:
+        for source_id in args.source_ids:
+            records = reader.get_all(source_id) if args.all else [r for r in [reader.get(source_id, args.run)] if r]
+            if not records:
+                print(f"{source_id}: not found", file=sys.stderr)
+                missing += 1
+            for record in records:
+                print(json.dumps(record, ensure_ascii=False))
+    finally:
+        reader.close()
+    if missing:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
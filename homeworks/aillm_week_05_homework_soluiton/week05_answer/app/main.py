@@ -1,11 +1,31 @@
-import os, sys, json, time, logging
+import sys, time, logging, argparse, asyncio
+from collections import Counter, OrderedDict, deque
+from typing import NamedTuple
+from itertools import islice
 from uuid import uuid4
 from pathlib import Path
 
-import pandas as pd
 from dotenv import load_dotenv
 
-from app.llm_chain import extract_ticket
+from app.lazy import lazy_import
+from app.hedging import HedgePolicy
+from app.cache import TicketCache, make_namespace
+from app.reader import stream_rows, check_columns, byte_ranges, MissingColumnsError
+from app.checkpoint import RunManifest, load_manifest, latest_unfinished_run, completed_source_ids, repair_tail
+from app.sharding import run_sharded, sort_shard
+from app.sinks import make_sink, dumps, FSYNC_POLICIES, HAVE_PYARROW
+from app.metrics import metrics, stage
+from app.priority import DEFAULT_AGING_HOURS, DEFAULT_WINDOW, LEVELS, schedule
+
+# pandas, LangChain and the modules built on them load on first use, so --help
+# and usage errors return in milliseconds (python -m app.importtime)
+pd = lazy_import("pandas")
+llm_chain = lazy_import("app.llm_chain")
+ratelimit = lazy_import("app.ratelimit")
+retry = lazy_import("app.retry")
+prefilter = lazy_import("app.prefilter")
+dedup = lazy_import("app.dedup")
+offsets = lazy_import("app.offsets")
 
 load_dotenv()  # load GOOGLE_API_KEY
 
@@ -16,65 +36,962 @@ logs_dir.mkdir(exist_ok=True, parents=True)
 logger = logging.getLogger("week05")
 logger.setLevel(logging.INFO)
 
-# console handler
-ch = logging.StreamHandler(sys.stdout)
-ch.setLevel(logging.INFO)
+# shard workers may import this module twice (as __mp_main__ and app.main)
+if not logger.handlers:
+    # console handler
+    ch = logging.StreamHandler(sys.stdout)
+    ch.setLevel(logging.INFO)
 
-# file handler
-fh = logging.FileHandler(logs_dir / "run.log", encoding="utf-8")
-fh.setLevel(logging.INFO)
+    # file handler
+    fh = logging.FileHandler(logs_dir / "run.log", encoding="utf-8")
+    fh.setLevel(logging.INFO)
 
-# formatter
-formatter = logging.Formatter("[%(asctime)s] %(levelname)s - %(message)s", "%Y-%m-%d %H:%M:%S")
-ch.setFormatter(formatter)
-fh.setFormatter(formatter)
+    # formatter
+    formatter = logging.Formatter("[%(asctime)s] %(levelname)s - %(message)s", "%Y-%m-%d %H:%M:%S")
+    ch.setFormatter(formatter)
+    fh.setFormatter(formatter)
 
-logger.addHandler(ch)
-logger.addHandler(fh)
+    logger.addHandler(ch)
+    logger.addHandler(fh)
 # -------------------------
 
-def main():
-    if len(sys.argv) < 2:
-        logger.error("Usage: python -m app.main /path/to/support_tickets_minimal.csv")
-        sys.exit(1)
+MAX_RETRIES = 2
+MAX_BACKLOG = 1024  # rows run_serial may hold back behind a row that is waiting to retry
+DEDUP_RECENT = 4096  # written representatives whose payload is kept for members that come later
+
+DEFAULT_CACHE_PATH = logs_dir / "extract_cache.sqlite3"
+RUNS_DIR = logs_dir / "runs"
+SHARDS_DIR = logs_dir / "shards"
+SUMMARY_PATH = logs_dir / "run_summary.json"
+PARQUET_DIR = logs_dir / "outputs.parquet"
+PROM_PATH = logs_dir / "metrics.prom"
+DEFAULT_CASCADE = "gemini-2.5-flash-lite,gemini-2.5-flash"
+
+cache = None  # TicketCache, set in main() when --cache is given
+hedge_policy = None  # HedgePolicy, set in configure() when --hedge is given
+retry_budget = None  # retry.RetryBudget, set in configure() with the --retry-budget ratio
+manifest = None  # RunManifest for the current run, set in main()
+rule_payloads = {}  # source_id -> payload answered by the pre-classifier, consumed by process_chunk
+run_stats = {"read": 0, "rule_skips": 0, "dedup_collapsed": 0, "summarized": 0, "summary_missing": 0}
+
+# near-duplicate collapsing (--dedup): member source_id -> representative source_id.
+# A representative's payload is held while members that were read are waiting
+# to be written (dedup_payloads), then kept in a bounded LRU for members further
+# down the input (dedup_recent). Members whose representative is in neither
+# place, or failed, are extracted on their own.
+dedup_index = None
+dedup_refs = {}
+dedup_open = set()  # representatives read but not written yet
+dedup_waiting = Counter()  # representative -> members read but not written yet
+dedup_payloads = {}
+dedup_recent = OrderedDict()
+
+# --priority: source_id -> urgency level of rows handed out by the scheduler,
+# and source_id -> perf_counter() when the row's extraction finished. Time to
+# triage is taken at extraction, not at the write: a row retrying at the head of
+# the output order would otherwise charge its wait to every row behind it.
+row_priority = {}
+row_extracted = {}
+triage_started = None  # perf_counter() when the scheduler started reading
+
+# --lazy-summary: field -> values whose tickets get a summary, set in configure()
+summary_rule = None
+SUMMARY_RULE_FIELDS = ("issue_type", "urgency", "channel", "status_suggestion")
+# Phase two runs across chunks: rows the rule selects wait in summary_pending,
+# (source_id, ticket_text, payload) in input order, until a call has
+# summary_batch of them or the writer can't go on without one. Their records
+# are held back (summary_held) until the summary is in or has failed for good.
+summary_batch = 16
+summary_pending = []
+summary_held = set()
+summary_tasks = {}  # async: source_id -> task sending its batch
+
+class DedupRef(NamedTuple):
+    rep_id: str
+    ticket_text: str  # extracted on its own if the representative fails
+
+class Retry(NamedTuple):
+    """A row whose last attempt failed with a retryable error; run_serial re-runs it at `due`."""
+    source_id: str
+    ticket_text: str
+    attempts: int
+    due: float
+
+class SummaryRetry(NamedTuple):
+    """A --lazy-summary batch whose call failed with a retryable error; run_serial re-sends it at `due`."""
+    batch: list
+    attempts: int
+    due: float
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.main",
+        description="Extract structured fields from support tickets with Gemini.",
+    )
+    parser.add_argument("csv_path", help="path to support_tickets_minimal.csv")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="run extractions concurrently with chain.ainvoke")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="max in-flight LLM calls in --async mode (default: 8)")
+    parser.add_argument("--pack-size", type=int, default=1,
+                        help="tickets per LLM call; >1 enables packed mode (default: 1)")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the CSV row by row instead of loading it with pandas (bounded memory)")
+    parser.add_argument("--cache", nargs="?", const=str(DEFAULT_CACHE_PATH), default=None, metavar="PATH",
+                        help=f"reuse results for already-seen ticket text (default path: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-ttl", type=float, default=None, metavar="SECONDS",
+                        help="expire cache entries older than this")
+    parser.add_argument("--cache-max-entries", type=int, default=None,
+                        help="keep at most this many entries, evicting least recently used")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="answer tickets locally when rule-based fields are confident, skipping the LLM")
+    parser.add_argument("--prefilter-threshold", type=float, default=0.8,
+                        help="min confidence every pre-classified field needs to skip the LLM (default: 0.8)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="extract near-duplicate tickets once (MinHash/LSH) and share the result")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                        help="min estimated Jaccard similarity to collapse two tickets (default: 0.8)")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="client-side requests/minute budget for Gemini calls")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="client-side (estimated) tokens/minute budget for Gemini calls")
+    parser.add_argument("--rate-state", default=None, metavar="PATH",
+                        help="SQLite file holding the shared rate budget, so several processes "
+                             "back off together")
+    parser.add_argument("--retry-budget", type=float, default=0.2,
+                        help="max retries as a share of first attempts, on top of 10 (default: 0.2)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="in --async mode, send a duplicate of any call slower than the observed p95")
+    parser.add_argument("--hedge-quantile", type=float, default=0.95,
+                        help="latency quantile after which a call is hedged (default: 0.95)")
+    parser.add_argument("--hedge-budget", type=float, default=0.05,
+                        help="max share of calls that may be hedged (default: 0.05)")
+    parser.add_argument("--cascade", nargs="?", const=DEFAULT_CASCADE, default=None, metavar="MODELS",
+                        help="comma-separated models, cheapest first; a ticket moves to the next one when the "
+                             f"answer is invalid or low-confidence (default: {DEFAULT_CASCADE})")
+    parser.add_argument("--cascade-min-confidence", type=float, default=0.7,
+                        help="min self-reported confidence to keep a cheaper model's answer (default: 0.7)")
+    parser.add_argument("--wire", choices=("full", "compact"), default="full",
+                        help="field names the model writes: full, or short keys with unknown entities "
+                             "left out (compact; fewer output tokens)")
+    parser.add_argument("--lazy-summary", nargs="?", const="urgency=high", default=None, metavar="RULE",
+                        help="extract fields without summary, then summarize only tickets matching RULE in "
+                             "batched calls; RULE is field=value[,field=value...], any match "
+                             "(default: urgency=high)")
+    parser.add_argument("--summary-batch", type=int, default=16,
+                        help="tickets per --lazy-summary call, collected across chunks (default: 16)")
+    parser.add_argument("--hybrid-entities", action="store_true",
+                        help="fill entities with the regex/gazetteer extractors in app.entities; the model "
+                             "only returns the top-level fields (and summary)")
+    parser.add_argument("--priority", action="store_true",
+                        help="extract urgent tickets first: rank rows by a local urgency score and created_at age")
+    parser.add_argument("--priority-window", type=int, default=DEFAULT_WINDOW, metavar="ROWS",
+                        help=f"rows read ahead and ranked at a time; 1 keeps CSV order (default: {DEFAULT_WINDOW})")
+    parser.add_argument("--priority-aging", type=float, default=DEFAULT_AGING_HOURS, metavar="HOURS",
+                        help="age at which a ticket has gained one urgency level (default: "
+                             f"{DEFAULT_AGING_HOURS:g}; 0 = urgency only)")
+    parser.add_argument("--sink-batch", type=int, default=256,
+                        help="group-commit outputs.jsonl every N records (default: 256)")
+    parser.add_argument("--sink-interval", type=float, default=1.0, metavar="SECONDS",
+                        help="...or after this many seconds, whichever comes first (default: 1.0)")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="none",
+                        help="fsync outputs.jsonl after every group commit (batch), at the end (close) "
+                             "or never (none, default)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="don't maintain the (run_id, source_id) -> offset index next to outputs.jsonl "
+                             "(python -m app.lookup catches up on its next use)")
+    parser.add_argument("--parquet", nargs="?", const=str(PARQUET_DIR), default=None, metavar="DIR",
+                        help=f"also write a Parquet dataset partitioned by run_id and date (default dir: {PARQUET_DIR})")
+    parser.add_argument("--parquet-row-group", type=int, default=10_000,
+                        help="records per Parquet row group (default: 10000)")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split the CSV across N worker processes, each with its own client (default: 1)")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="continue an interrupted run, skipping source_ids it already wrote "
+                             "(default: latest unfinished run for this CSV)")
+    return parser.parse_args(argv)
+
+def write_record(sink, run_id: str, source_id: str, payload: dict, dedup_of: str = None):
+    # encode once: the same string goes to the log line and the sink
+    payload_json = dumps(payload)
+    # log to console/file (pretty JSON one-liner)
+    logger.info("row %s: %s", source_id, payload_json)
+    # append JSONL with metadata
+    run_meta = {"run_id": run_id, "source_id": source_id, "ts": time.time()}
+    if dedup_of is not None:
+        run_meta["dedup_of"] = dedup_of
+    with stage("write"):
+        sink.write_record(run_meta, payload, payload_json)
+
+def _should_retry(what: str, attempts: int, e: Exception) -> bool:
+    # what: "row <source_id>" or "summary call for <n> tickets"
+    if retry.classify_error(e) == retry.PERMANENT:
+        logger.error("%s failed permanently (%s): %s", what, type(e).__name__, e)
+        return False
+    if attempts >= MAX_RETRIES:
+        logger.error("%s failed after %d retries: %s", what, attempts, e)
+        return False
+    if not retry_budget.try_spend():
+        logger.error("%s not retried, retry budget exhausted: %s", what, e)
+        return False
+    return True
+
+def process_row(source_id: str, ticket_text: str, attempts: int = 0):
+    with stage("row"):
+        return _process_row(source_id, ticket_text, attempts)
+
+def _process_row(source_id: str, ticket_text: str, attempts: int = 0):
+    # one attempt: a retryable failure comes back as a Retry that run_serial
+    # schedules, so the loop keeps reading rows instead of sleeping
+    if attempts == 0:
+        retry_budget.record_attempt()
+    try:
+        return llm_chain.extract_ticket(ticket_text).model_dump()
+    except Exception as e:
+        if not _should_retry(f"row {source_id}", attempts, e):
+            return None
+        attempts += 1
+        delay = retry.backoff(attempts)
+        logger.warning("row %s failed (attempt %d), retrying in %.1fs: %s", source_id, attempts, delay, e)
+        return Retry(source_id, ticket_text, attempts, time.monotonic() + delay)
+
+async def aprocess_row(source_id: str, ticket_text: str, sem: asyncio.Semaphore):
+    with stage("row"):
+        return await _aprocess_row(source_id, ticket_text, sem)
+
+async def _aprocess_row(source_id: str, ticket_text: str, sem: asyncio.Semaphore):
+    retry_budget.record_attempt()
+    attempts = 0
+    while True:
+        try:
+            async with sem:
+                result = await llm_chain.aextract_ticket(ticket_text)
+            return result.model_dump()
+        except Exception as e:
+            if not _should_retry(f"row {source_id}", attempts, e):
+                return None
+            attempts += 1
+            delay = retry.backoff(attempts)
+            logger.warning("row %s failed (attempt %d), retrying in %.1fs: %s", source_id, attempts, delay, e)
+            # back off outside the semaphore so other rows keep the slot busy
+            await asyncio.sleep(delay)
+
+def _from_dedup(chunk):
+    refs, todo = {}, []
+    for source_id, ticket_text in chunk:
+        rep_id = dedup_refs.pop(source_id, None)
+        if rep_id is None:
+            todo.append((source_id, ticket_text))
+        else:
+            refs[source_id] = DedupRef(rep_id, ticket_text)
+    return refs, todo
+
+def _from_rules(chunk):
+    hits, todo = {}, []
+    for source_id, ticket_text in chunk:
+        payload = rule_payloads.pop(source_id, None)
+        if payload is None:
+            todo.append((source_id, ticket_text))
+        else:
+            hits[source_id] = payload
+    return hits, todo
+
+def _from_cache(chunk):
+    if cache is None:
+        return {}, chunk
+    hits, todo = {}, []
+    for source_id, ticket_text in chunk:
+        with stage("cache_lookup"):
+            payload = cache.get(ticket_text)
+        if payload is None:
+            todo.append((source_id, ticket_text))
+        else:
+            hits[source_id] = payload
+    return hits, todo
+
+def _to_cache(chunk, payloads: dict):
+    if cache is None:
+        return
+    for source_id, ticket_text in chunk:
+        if isinstance(payloads.get(source_id), dict):
+            cache.put(ticket_text, payloads[source_id])
+
+def parse_summary_rule(text: str) -> dict:
+    """"urgency=high,issue_type=billing" -> {"urgency": {"high"}, "issue_type": {"billing"}}"""
+    rule = {}
+    for part in text.split(","):
+        field, sep, value = (p.strip() for p in part.partition("="))
+        if not sep or field not in SUMMARY_RULE_FIELDS or not value:
+            raise ValueError(f"bad --lazy-summary condition {part!r}, expected <field>=<value> "
+                             f"with field one of {', '.join(SUMMARY_RULE_FIELDS)}")
+        rule.setdefault(field, set()).add(value)
+    return rule
+
+def _summary_todo(chunk, payloads: dict):
+    if summary_rule is None:
+        return []
+    return [(sid, text) for sid, text in chunk
+            if isinstance(payloads.get(sid), dict) and not payloads[sid].get("summary")
+            and any(payloads[sid].get(field) in values for field, values in summary_rule.items())]
+
+def _queue_summaries(chunk, payloads: dict) -> set:
+    """--lazy-summary phase two: queue the chunk's tickets the rule selects; returns their source_ids."""
+    todo = _summary_todo(chunk, payloads)
+    for sid, text in todo:
+        summary_pending.append((sid, text, payloads[sid]))
+        summary_held.add(sid)
+    return {sid for sid, _ in todo}
+
+def _take_summaries() -> list:
+    batch = summary_pending[:summary_batch]
+    del summary_pending[:summary_batch]
+    return batch
+
+def _summaries_done(batch, summaries: dict):
+    for sid, text, payload in batch:
+        if sid in summaries:
+            payload["summary"] = summaries[sid]
+            run_stats["summarized"] += 1
+        else:
+            run_stats["summary_missing"] += 1
+        summary_held.discard(sid)
+        if cache is not None:
+            cache.put(text, payload)
+
+def _send_summaries(batch, attempts: int = 0):
+    """One summary call; a retryable failure comes back as a SummaryRetry for run_serial to schedule."""
+    if attempts == 0:
+        retry_budget.record_attempt()
+    try:
+        summaries = llm_chain.summarize([(sid, text) for sid, text, _ in batch])
+    except Exception as e:
+        what = f"summary call for {len(batch)} tickets"
+        if _should_retry(what, attempts, e):
+            attempts += 1
+            delay = retry.backoff(attempts)
+            logger.warning("%s failed (attempt %d), retrying in %.1fs: %s", what, attempts, delay, e)
+            return SummaryRetry(batch, attempts, time.monotonic() + delay)
+        summaries = {}  # written without
+    _summaries_done(batch, summaries)
+    return None
+
+async def _asend_summaries(batch, sem: asyncio.Semaphore):
+    retry_budget.record_attempt()
+    what = f"summary call for {len(batch)} tickets"
+    attempts = 0
+    while True:
+        try:
+            async with sem:
+                summaries = await llm_chain.asummarize([(sid, text) for sid, text, _ in batch])
+            break
+        except Exception as e:
+            if not _should_retry(what, attempts, e):
+                summaries = {}  # written without
+                break
+            attempts += 1
+            delay = retry.backoff(attempts)
+            logger.warning("%s failed (attempt %d), retrying in %.1fs: %s", what, attempts, delay, e)
+            await asyncio.sleep(delay)
+    _summaries_done(batch, summaries)
+
+def _astart_summaries(sem: asyncio.Semaphore, flush: bool = False):
+    # full batches go out as soon as they are full; the rest only when flushed
+    while len(summary_pending) >= summary_batch or (flush and summary_pending):
+        batch = _take_summaries()
+        task = asyncio.create_task(_asend_summaries(batch, sem))
+        for sid, _, _ in batch:
+            summary_tasks[sid] = task
+
+def _extract_chunk(chunk) -> dict:
+    if not chunk:
+        return {}
+    if len(chunk) == 1:
+        source_id, ticket_text = chunk[0]
+        return {source_id: process_row(source_id, ticket_text)}
+
+    try:
+        results, leftovers = llm_chain.extract_packed(chunk)
+    except Exception as e:
+        logger.warning("packed call for %d tickets failed, sending one by one: %s", len(chunk), e)
+        results, leftovers = {}, chunk
+    if leftovers:
+        logger.info("re-sending %d/%d tickets from packed call on their own", len(leftovers), len(chunk))
+    singles = {sid: process_row(sid, text) for sid, text in leftovers}
+    return {sid: results[sid].model_dump() if sid in results else singles[sid] for sid, _ in chunk}
+
+async def _aextract_chunk(chunk, sem: asyncio.Semaphore) -> dict:
+    if not chunk:
+        return {}
+    if len(chunk) == 1:
+        source_id, ticket_text = chunk[0]
+        return {source_id: await aprocess_row(source_id, ticket_text, sem)}
+
+    try:
+        async with sem:
+            results, leftovers = await llm_chain.aextract_packed(chunk)
+    except Exception as e:
+        logger.warning("packed call for %d tickets failed, sending one by one: %s", len(chunk), e)
+        results, leftovers = {}, chunk
+    if leftovers:
+        logger.info("re-sending %d/%d tickets from packed call on their own", len(leftovers), len(chunk))
+    singles = await asyncio.gather(*(aprocess_row(sid, text, sem) for sid, text in leftovers))
+    singles = dict(zip((sid for sid, _ in leftovers), singles))
+    return {sid: results[sid].model_dump() if sid in results else singles[sid] for sid, _ in chunk}
+
+def process_chunk(chunk):
+    """Returns [(source_id, payload | None), ...] in chunk order."""
+    with stage("chunk"):
+        results = _process_chunk(chunk)
+    _mark_extracted(results)
+    return results
+
+def _process_chunk(chunk):
+    refs, todo = _from_dedup(chunk)
+    rule_hits, todo = _from_rules(todo)
+    hits, todo = _from_cache(todo)
+    fresh = _extract_chunk(todo)
+    payloads = {**refs, **rule_hits, **hits, **fresh}
+    # rows waiting for a summary are cached once it is in
+    queued = _queue_summaries(chunk, payloads)
+    _to_cache([row for row in todo if row[0] not in queued], payloads)
+    return [(sid, payloads.get(sid)) for sid, _ in chunk]
+
+async def aprocess_chunk(chunk, sem: asyncio.Semaphore, hold: bool = False):
+    """hold=True returns before --lazy-summary summaries are in (see summary_held); run_async waits for them."""
+    with stage("chunk"):
+        results = await _aprocess_chunk(chunk, sem, hold)
+    _mark_extracted(results)
+    return results
+
+async def _aprocess_chunk(chunk, sem: asyncio.Semaphore, hold: bool = False):
+    refs, todo = _from_dedup(chunk)
+    rule_hits, todo = _from_rules(todo)
+    hits, todo = _from_cache(todo)
+    fresh = await _aextract_chunk(todo, sem)
+    payloads = {**refs, **rule_hits, **hits, **fresh}
+    queued = _queue_summaries(chunk, payloads)
+    _to_cache([row for row in todo if row[0] not in queued], payloads)
+    _astart_summaries(sem, flush=not hold)
+    if not hold:
+        for sid in queued:
+            await summary_tasks.pop(sid)
+    return [(sid, payloads.get(sid)) for sid, _ in chunk]
+
+def chunked(rows, size: int):
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+def _keep_recent(rep_id: str, payload: dict):
+    dedup_recent[rep_id] = payload
+    if len(dedup_recent) > DEDUP_RECENT:
+        dedup_recent.popitem(last=False)
+
+def _rep_failed(ref: DedupRef) -> bool:
+    # representatives come earlier in the input, so by the time a member is
+    # written its representative has been written, or has failed
+    return ref.rep_id not in dedup_payloads
+
+def _member_done(rep_id: str):
+    dedup_waiting[rep_id] -= 1
+    if dedup_waiting[rep_id] <= 0:
+        del dedup_waiting[rep_id]
+        payload = dedup_payloads.pop(rep_id, None)
+        if payload is not None:
+            _keep_recent(rep_id, payload)
+
+def _redo_member(source_id: str, ref: DedupRef):
+    logger.warning("row %s: representative %s failed, extracting it on its own", source_id, ref.rep_id)
+    _member_done(ref.rep_id)
+    run_stats["dedup_collapsed"] -= 1
 
-    csv_path = sys.argv[1]
-    df = pd.read_csv(csv_path)
+def write_results(sink, run_id: str, results) -> int:
+    """Write (source_id, payload) pairs; members of a failed representative must be re-extracted first."""
+    done = 0
+    for source_id, payload in results:
+        dedup_of = None
+        if isinstance(payload, DedupRef):
+            dedup_of = payload.rep_id
+            payload = dedup_payloads[dedup_of]
+            _member_done(dedup_of)
+        elif source_id in dedup_open:
+            dedup_open.discard(source_id)
+            if payload is not None and dedup_waiting[source_id]:
+                dedup_payloads[source_id] = payload
+            elif payload is not None:
+                _keep_recent(source_id, payload)
+        if payload is not None:
+            write_record(sink, run_id, source_id, payload, dedup_of)
+            done += 1
+            level = row_priority.pop(source_id, None)
+            if level is not None:
+                extracted = row_extracted.pop(source_id, None) or time.perf_counter()
+                metrics.observe(f"triage:{level}", extracted - triage_started)
+        else:
+            row_priority.pop(source_id, None)
+            row_extracted.pop(source_id, None)
+    return done
+
+def _mark_extracted(results):
+    # (source_id, payload) pairs; a near-duplicate counts once its chunk is back
+    if row_priority:
+        now = time.perf_counter()
+        for source_id, payload in results:
+            if source_id in row_priority and isinstance(payload, (dict, DedupRef)):
+                row_extracted[source_id] = now
+
+def _finish_single(source_id: str, ticket_text: str, payload):
+    # a row extracted outside its chunk (retried, or re-extracted member) still gets its summary and cache entry
+    row, payloads = [(source_id, ticket_text)], {source_id: payload}
+    if not _queue_summaries(row, payloads):
+        _to_cache(row, payloads)
+
+async def _await_summary(source_id: str, window, sem: asyncio.Semaphore):
+    # let the rest of the window add to the batch before sending a short one
+    while source_id not in summary_tasks and (running := [t for t in window if not t.done()]):
+        await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+    if source_id not in summary_tasks:
+        _astart_summaries(sem, flush=True)
+    await summary_tasks.pop(source_id)
+
+def run_serial(rows, sink, run_id: str, pack_size: int = 1, flush_interval: float = 1.0) -> int:
+    done = 0
+    backlog = deque()  # [source_id, payload | Retry] in input order
+    retries = retry.RetryQueue()
+    chunks = chunked(rows, pack_size)
+    while True:
+        for entry in retries.pop_due():
+            if isinstance(entry, SummaryRetry):
+                entry = _send_summaries(entry.batch, entry.attempts)
+                if entry is not None:
+                    retries.push(entry.due, entry)
+                continue
+            r = entry[1]
+            entry[1] = process_row(r.source_id, r.ticket_text, r.attempts)
+            if isinstance(entry[1], Retry):
+                retries.push(entry[1].due, entry)
+            else:
+                _mark_extracted([entry])
+                _finish_single(r.source_id, r.ticket_text, entry[1])
+
+        reading = chunks is not None and len(backlog) < MAX_BACKLOG
+        # write everything up to the first row that is still waiting
+        while backlog and not isinstance(backlog[0][1], Retry):
+            entry = backlog[0]
+            if isinstance(entry[1], DedupRef) and _rep_failed(entry[1]):
+                _redo_member(*entry)
+                ticket_text = entry[1].ticket_text
+                entry[1] = process_row(entry[0], ticket_text)
+                if isinstance(entry[1], Retry):
+                    retries.push(entry[1].due, entry)
+                    break
+                _mark_extracted([entry])
+                _finish_single(entry[0], ticket_text, entry[1])
+            if entry[0] in summary_held:
+                if reading:
+                    break  # more rows may still fill the summary batch
+                # nothing else to read: send what is queued up to this row
+                while any(sid == entry[0] for sid, _, _ in summary_pending):
+                    again = _send_summaries(_take_summaries())
+                    if again is not None:
+                        retries.push(again.due, again)
+                if entry[0] in summary_held:
+                    break
+            done += write_results(sink, run_id, [tuple(backlog.popleft())])
+
+        if chunks is not None and len(backlog) < MAX_BACKLOG:
+            chunk = next(chunks, None)
+            if chunk is None:
+                chunks = None
+                continue
+            for source_id, payload in process_chunk(chunk):
+                entry = [source_id, payload]
+                backlog.append(entry)
+                if isinstance(payload, Retry):
+                    retries.push(payload.due, entry)
+            while len(summary_pending) >= summary_batch:
+                again = _send_summaries(_take_summaries())
+                if again is not None:
+                    retries.push(again.due, again)
+        elif retries:
+            # nothing to read until a retry is due; keep the sink's time limit meanwhile
+            while (wait := retries.next_due() - time.monotonic()) > 0:
+                sink.poll()
+                time.sleep(min(wait, max(flush_interval, 0.01)))
+            sink.poll()
+        else:
+            return done
+
+async def _poll_sink(sink, interval: float):
+    # while the head of the window is still in flight nothing gets written, so
+    # buffered records would otherwise wait past the sink's time limit
+    while True:
+        await asyncio.sleep(max(interval, 0.01))
+        sink.poll()
+
+async def run_async(rows, sink, run_id: str, concurrency: int, pack_size: int = 1,
+                    flush_interval: float = 1.0) -> int:
+    poller = asyncio.create_task(_poll_sink(sink, flush_interval))
+    try:
+        return await _run_async(rows, sink, run_id, concurrency, pack_size)
+    finally:
+        poller.cancel()
+
+async def _run_async(rows, sink, run_id: str, concurrency: int, pack_size: int = 1) -> int:
+    sem = asyncio.Semaphore(concurrency)
+    # Only a bounded window of chunks is scheduled at a time, so a streamed CSV
+    # is never pulled into memory all at once; a few extra chunks per slot keep
+    # the semaphore busy while the head of the window is being written.
+    max_pending = concurrency * 4
+    window = deque()
+
+    # Write in input order as soon as the next chunk is ready, so outputs.jsonl
+    # has the same source_id order as a serial run regardless of completion order.
+    done = 0
+    async def write_head():
+        nonlocal done
+        for source_id, payload in await window.popleft():
+            if isinstance(payload, DedupRef) and _rep_failed(payload):
+                _redo_member(source_id, payload)
+                ticket_text = payload.ticket_text
+                payload = await aprocess_row(source_id, ticket_text, sem)
+                _mark_extracted([(source_id, payload)])
+                _finish_single(source_id, ticket_text, payload)
+            if source_id in summary_held:
+                await _await_summary(source_id, window, sem)
+            done += write_results(sink, run_id, [(source_id, payload)])
+
+    for chunk in chunked(rows, pack_size):
+        window.append(asyncio.create_task(aprocess_chunk(chunk, sem, hold=True)))
+        if len(window) >= max_pending:
+            await write_head()
+    while window:
+        await write_head()
+    return done
+
+def _counted(rows):
+    for row in rows:
+        run_stats["read"] += 1
+        yield row
+
+def _prioritized(rows, window: int, aging_hours: float):
+    # (source_id, ticket_text, created_at) in CSV order -> (source_id, ticket_text), most urgent first
+    global triage_started
+    triage_started = time.perf_counter()
+    for source_id, ticket_text, level in schedule(rows, window, aging_hours):
+        row_priority[source_id] = level
+        yield source_id, ticket_text
+
+def _deduped(rows):
+    for source_id, ticket_text in rows:
+        with stage("dedup"):
+            rep_id = dedup_index.add_or_match(source_id, ticket_text)
+        if rep_id is None or rep_id == source_id:
+            dedup_open.add(source_id)
+        elif rep_id in dedup_open or rep_id in dedup_payloads or rep_id in dedup_recent:
+            if rep_id in dedup_recent:
+                dedup_payloads[rep_id] = dedup_recent.pop(rep_id)  # held until this member is written
+            dedup_refs[source_id] = rep_id
+            dedup_waiting[rep_id] += 1
+            run_stats["dedup_collapsed"] += 1
+        yield source_id, ticket_text
+
+def _prefiltered(rows, threshold: float, local_entities: bool = False, block_size: int = 256):
+    # classify a block at a time so the rules run as vectorized string ops
+    for block in chunked(rows, block_size):
+        with stage("prefilter_block"):
+            # near-duplicates already get their representative's answer
+            resolved = prefilter.resolve([row for row in block if row[0] not in dedup_refs], threshold,
+                                         local_entities)
+        run_stats["rule_skips"] += len(resolved)
+        rule_payloads.update(resolved)
+        yield from block
+
+def open_rows(args):
+    """(rows iterator, total row count or None); exits on a bad CSV.
+
+    Rows are (source_id, ticket_text), plus created_at with --priority.
+    """
+    extra = ("created_at",) if args.priority else ()
+    if args.stream:
+        try:
+            rows = stream_rows(args.csv_path, extra)
+        except MissingColumnsError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        return rows, None  # count unknown until the stream is exhausted
+
+    df = pd.read_csv(args.csv_path)
 
     if not {"user_id", "sikayet"}.issubset(df.columns):
         logger.error(f"Expected columns user_id and sikayet. Found: {list(df.columns)}")
         sys.exit(1)
 
+    columns = [df[c].astype(str) if c in df.columns else [""] * len(df) for c in ("user_id", "sikayet", *extra)]
+    return zip(*columns), len(df)
+
+def resolve_run_id(args) -> str:
+    if not args.resume:
+        return str(uuid4())
+    if args.resume != "latest":
+        return args.resume
+    run_id = latest_unfinished_run(RUNS_DIR, args.csv_path)
+    if run_id is None:
+        logger.error("No unfinished run found for %s in %s", args.csv_path, RUNS_DIR)
+        sys.exit(1)
+    return run_id
+
+def _prompt_key(args) -> str:
+    # which prompt produced a cached payload; summaries depend on the rule too
+    key = llm_chain.prompt_hash()
+    return f"{key}:{args.lazy_summary}" if args.lazy_summary else key
+
+def validate_args(args):
+    """Reject flag combinations the pipeline can't run (ValueError) and warn about ignored ones."""
+    if min(args.concurrency, args.pack_size, args.shards, args.priority_window, args.summary_batch) < 1:
+        raise ValueError("--concurrency, --pack-size, --shards, --priority-window and --summary-batch must be >= 1")
+    if args.hedge and not args.use_async:
+        logger.warning("--hedge only applies in --async mode; ignoring it")
+    if args.wire != "full" and (args.pack_size > 1 or args.cascade):
+        # packed and cascade calls always use the full schema
+        raise ValueError("--wire compact only applies to single-ticket calls; "
+                         "it can't be combined with --pack-size > 1 or --cascade")
+    if args.lazy_summary:
+        parse_summary_rule(args.lazy_summary)
+        if args.wire != "full" or args.cascade:
+            raise ValueError("--lazy-summary can't be combined with --wire compact or --cascade yet")
+    if args.hybrid_entities and args.wire != "full":
+        raise ValueError("--hybrid-entities can't be combined with --wire compact yet")
+    if args.cascade and args.pack_size > 1:
+        logger.warning("--cascade applies to single-ticket calls; packed calls keep using the default model")
+    if args.parquet and not HAVE_PYARROW:
+        raise ValueError("--parquet needs pyarrow: pip install 'week05-answer[parquet]'")
+
+def reset_run_state():
+    """Forget the previous run's counters, metrics and per-row state, so main() can run twice in one process."""
+    global triage_started
+    run_stats.update(dict.fromkeys(run_stats, 0))
+    metrics.reset()
+    for state in (rule_payloads, dedup_refs, dedup_open, dedup_waiting, dedup_payloads, dedup_recent,
+                  row_priority, row_extracted, summary_pending, summary_held, summary_tasks):
+        state.clear()
+    triage_started = None
+
+def configure(args):
+    """Install the cache, dedup index, retry budget, hedging, rate limiter and model options; returns the limiter.
+
+    Every setting is written, on or off, so nothing carries over from an earlier configure().
+    """
+    global cache, dedup_index, hedge_policy, retry_budget, summary_rule, summary_batch
+    retry_budget = retry.RetryBudget(ratio=args.retry_budget)
+    hedge_policy = HedgePolicy(quantile=args.hedge_quantile, budget=args.hedge_budget) if args.hedge else None
+    llm_chain.configure_hedging(hedge_policy)
+    summary_rule = parse_summary_rule(args.lazy_summary) if args.lazy_summary else None
+    summary_batch = args.summary_batch
+    llm_chain.configure_summary(bool(args.lazy_summary))
+    llm_chain.configure_entities(args.hybrid_entities)
+    llm_chain.configure_wire(args.wire)
+    llm_chain.configure_cascade(args.cascade.split(",") if args.cascade else None, args.cascade_min_confidence)
+    dedup_index = dedup.NearDuplicateIndex(threshold=args.dedup_threshold) if args.dedup else None
+    cache = None
+    if args.cache:
+        cache = TicketCache(
+            args.cache,
+            make_namespace(_prompt_key(args), llm_chain.model_key(args.cascade or llm_chain.MODEL_NAME),
+                           llm_chain.SCHEMA_VERSION),
+            max_entries=args.cache_max_entries,
+            ttl=args.cache_ttl,
+        )
+
+    limiter = None
+    if args.rpm or args.tpm or args.rate_state:
+        limiter = ratelimit.RateLimiter(args.rpm, args.tpm, state_path=args.rate_state,
+                                        initial_concurrency=args.concurrency, max_concurrency=args.concurrency)
+    llm_chain.configure_rate_limiter(limiter)
+    return limiter
+
+def process(rows, out_path, run_id: str, args) -> int:
+    rows = _counted(rows)
+    if args.priority:
+        # before dedup, so a near-duplicate's representative is still handed out first
+        rows = _prioritized(rows, args.priority_window, args.priority_aging)
+    if args.dedup:
+        rows = _deduped(rows)
+    if args.prefilter:
+        rows = _prefiltered(rows, args.prefilter_threshold, args.hybrid_entities)
+    # the manifest counts what the sink has committed; shard workers have none
+    on_commit = manifest.advance if manifest is not None else None
+    with make_sink(out_path, args, on_commit) as sink:
+        if args.use_async:
+            return asyncio.run(run_async(rows, sink, run_id, args.concurrency, args.pack_size,
+                                         args.sink_interval))
+        return run_serial(rows, sink, run_id, args.pack_size, args.sink_interval)
+
+def collect_stats(done: int, limiter) -> dict:
+    stats = {"done": done, **run_stats, "metrics": metrics}
+    if limiter is not None:
+        stats["limiter"] = limiter.stats()
+    stats["retries"] = retry_budget.stats()
+    if hedge_policy is not None:
+        stats["hedging"] = hedge_policy.stats()
+    if llm_chain.cascade:
+        stats["cascade"] = llm_chain.cascade_stats()
+    if cache is not None:
+        stats["cache"] = cache.stats()
+        cache.close()
+    return stats
+
+def log_summary(stats: dict, elapsed: float, args):
+    rate = stats["done"] / elapsed if elapsed > 0 else 0.0
+    logger.info("Processed %d/%d tickets in %.2fs (%.2f tickets/sec)",
+                stats["done"], stats["read"], elapsed, rate)
+    if args.prefilter:
+        logger.info("Pre-classifier: %d/%d tickets answered by rules, LLM call skipped",
+                    stats["rule_skips"], stats["read"])
+    if args.lazy_summary:
+        logger.info("Lazy summary: %d/%d tickets summarized (rule %s), %d summaries missing",
+                    stats["summarized"], stats["done"], args.lazy_summary, stats["summary_missing"])
+    if args.hybrid_entities:
+        entities = stats["metrics"].summary()["stages"].get("entities", {})
+        logger.info("Hybrid entities: filled locally for %d model answers (%.3f ms each)",
+                    entities.get("count", 0), entities.get("mean_ms", 0.0))
+    if args.priority:
+        stages = stats["metrics"].summary()["stages"]
+        for level in LEVELS:
+            triage = stages.get(f"triage:{level}")
+            if triage:
+                logger.info("Priority %s: %d tickets, time-to-triage p50/p95/max %.2f/%.2f/%.2f s",
+                            level, triage["count"], triage["p50_ms"] / 1000, triage["p95_ms"] / 1000,
+                            triage["max_ms"] / 1000)
+    if args.dedup:
+        logger.info("Dedup: %d/%d tickets reused a near-duplicate's extraction",
+                    stats["dedup_collapsed"], stats["read"])
+    counters = stats["metrics"].counters
+    if counters.get("repaired") or counters.get("repair_failed"):
+        logger.info("Local repair: %d model outputs fixed without a re-call, %d could not be fixed",
+                    counters.get("repaired", 0), counters.get("repair_failed", 0))
+    r = stats["retries"]
+    if r["retries"] or r["denied"]:
+        logger.info("Retries: %d scheduled for %d first attempts, %d refused by the retry budget",
+                    r["retries"], r["first_attempts"], r["denied"])
+    if "hedging" in stats:
+        h = stats["hedging"]
+        stages = stats["metrics"].summary()["stages"]
+        seen = stages.get("llm_call", {}).get("p99_ms", 0.0)
+        unhedged = stages.get("llm_call_unhedged", {}).get("p99_ms", 0.0)
+        logger.info("Hedging: %d extra calls (%.1f%% of %d, %d won, %d over budget); "
+                    "p99 %.0f ms unhedged -> %.0f ms seen",
+                    h["hedges"], 100.0 * h["hedges"] / h["calls"] if h["calls"] else 0.0, h["calls"],
+                    h["hedge_wins"], h["over_budget"], unhedged, seen)
+    if "cascade" in stats:
+        stages = stats["metrics"].summary()["stages"]
+        for name, t in stats["cascade"].items():
+            latency = stages.get(f"tier:{name}", {})
+            logger.info("Cascade %s: %d/%d answers kept (%.1f%%), passed on %d low-confidence, %d invalid, "
+                        "%d failed calls; p50/p99 %.0f/%.0f ms",
+                        name, t["accepted"], t["calls"], 100.0 * t["accepted"] / t["calls"] if t["calls"] else 0.0,
+                        t["low_confidence"], t["invalid"], t["errors"],
+                        latency.get("p50_ms", 0.0), latency.get("p99_ms", 0.0))
+    if "limiter" in stats:
+        lim = stats["limiter"]
+        logger.info("Rate limiter: %d throttles, waited %.2fs for budget, final concurrency limit %.2f",
+                    lim["throttles"], lim["waited_seconds"], lim["concurrency_limit"])
+    if "cache" in stats:
+        c = stats["cache"]
+        logger.info("Cache: %d hits / %d misses (%.1f%% hit rate), %d evicted",
+                    c["hits"], c["misses"], 100 * c["hit_rate"], c["evicted"])
+
+def write_metrics(stats: dict, elapsed: float, run_id: str):
+    run_metrics = stats.pop("metrics")
+    run_metrics.write_json(SUMMARY_PATH, run_id=run_id, elapsed_s=round(elapsed, 3),
+                           **{k: v for k, v in stats.items()})
+    run_metrics.write_prometheus(PROM_PATH, run_id=run_id)
+    network = run_metrics.summary()["stages"].get("network")
+    if network:
+        logger.info("LLM latency p50/p95/p99: %.0f/%.0f/%.0f ms; tokens in/out: %d/%d",
+                    network["p50_ms"], network["p95_ms"], network["p99_ms"],
+                    run_metrics.tokens["input"], run_metrics.tokens["output"])
+    logger.info("Stage timings written to %s and %s", SUMMARY_PATH, PROM_PATH)
+
+def run_shard(args, run_id: str, byte_range, shard_path) -> dict:
+    """Worker-process entry point for --shards: streams the rows in byte_range of the CSV."""
     out_path = logs_dir / "outputs.jsonl"
-    run_id = str(uuid4())
-    max_retries = 2
-
-    with open(out_path, "a", encoding="utf-8") as fout:
-        for _, row in df.iterrows():
-            source_id = str(row["user_id"])
-            ticket_text = str(row["sikayet"])
-
-            attempts = 0
-            while True:
-                try:
-                    result = extract_ticket(ticket_text)
-                    payload = result.model_dump()
-                    # log to console/file (pretty JSON one-liner)
-                    logger.info("row %s: %s", source_id, json.dumps(payload, ensure_ascii=False))
-                    # append JSONL with metadata
-                    fout.write(json.dumps({
-                        "run_meta": {"run_id": run_id, "source_id": source_id, "ts": time.time()},
-                        "data": payload
-                    }, ensure_ascii=False) + "\n")
-                    break
-                except Exception as e:
-                    if attempts >= max_retries:
-                        logger.error("row %s failed permanently: %s", source_id, e)
-                        break
-                    attempts += 1
-                    logger.warning("row %s failed (attempt %d), retrying: %s", source_id, attempts, e)
-                    time.sleep(1.5 ** attempts)
+    rows = stream_rows(args.csv_path, ("created_at",) if args.priority else (), byte_range)
+    if args.resume:
+        already = completed_source_ids(out_path, run_id) | completed_source_ids(shard_path, run_id)
+        rows = (row for row in rows if row[0] not in already)
+        repair_tail(shard_path)
+
+    limiter = configure(args)
+    done = process(rows, shard_path, run_id, args)
+    sort_shard(shard_path)
+    return collect_stats(done, limiter)
+
+def main(argv=None):
+    global manifest
+    args = parse_args(argv)
+    try:
+        validate_args(args)
+    except ValueError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+    reset_run_state()
+
+    if args.shards > 1:
+        # the workers read their own byte ranges; here only the header is checked
+        try:
+            check_columns(args.csv_path)
+        except MissingColumnsError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        rows, total_rows = (), None
+    else:
+        rows, total_rows = open_rows(args)
+
+    out_path = logs_dir / "outputs.jsonl"
+    run_id = resolve_run_id(args)
+    skipped = 0
+    if args.resume:
+        previous = load_manifest(RUNS_DIR / f"{run_id}.json") or {}
+        if previous.get("shards", args.shards) != args.shards:
+            # other byte ranges would redo rows another shard already wrote, or skip some
+            logger.error("Run %s was started with --shards %d; resume it with the same --shards",
+                         run_id, previous["shards"])
+            sys.exit(1)
+        already = completed_source_ids(out_path, run_id)
+        for shard_path in sorted((SHARDS_DIR / run_id).glob("shard-*.jsonl")):
+            already |= completed_source_ids(shard_path, run_id)  # written but not merged yet
+        rows = (row for row in rows if row[0] not in already)
+        skipped = len(already)
+        repair_tail(out_path)
+        logger.info("Resuming run %s: %d source_ids already done", run_id, skipped)
+
+    manifest = RunManifest(RUNS_DIR, run_id, args.csv_path, total_rows=total_rows, skipped=skipped,
+                           shards=args.shards)
+
+    started = time.perf_counter()
+    try:
+        if args.shards > 1:
+            ranges = byte_ranges(args.csv_path, args.shards)
+            stats = run_sharded(run_shard, args, run_id, ranges, SHARDS_DIR / run_id, out_path)
+            if not args.no_index:
+                index = offsets.OffsetIndex(out_path)
+                index.sync()  # the merge appended to outputs.jsonl without a sink
+                index.close()
+        else:
+            limiter = configure(args)
+            done = process(rows, out_path, run_id, args)
+            stats = collect_stats(done, limiter)
+    except BaseException:
+        manifest.finish("interrupted")
+        raise
+    # rows that failed permanently are left for a later --resume
+    manifest.data["done"] = stats["done"]
+    manifest.finish("completed" if stats["done"] == stats["read"] else "partial")
+    elapsed = time.perf_counter() - started
 
+    log_summary(stats, elapsed, args)
+    write_metrics(stats, elapsed, run_id)
     logger.info("Done. Wrote logs to %s", out_path)
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+import json
+import math
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+# Per-stage latency + token accounting for one run.
+# Samples are kept raw (8 bytes each) so p50/p95/p99 are exact. Counts, sums and
+# Prometheus buckets are cumulative; a long-lived process (app.service) passes
+# max_samples so percentiles cover the most recent samples and memory stays flat.
+
+PROM_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _percentile(sorted_samples, q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    # nearest-rank
+    idx = max(0, math.ceil(q * len(sorted_samples)) - 1)
+    return sorted_samples[idx]
+
+class Metrics:
+    def __init__(self, max_samples: Optional[int] = None):
+        self.max_samples = max_samples
+        self.samples: Dict[str, array] = {}
+        self.totals: Dict[str, list] = {}  # stage -> [count, sum, per-bucket counts (+Inf last)]
+        self.tokens = {"input": 0, "output": 0}
+        self.counters: Dict[str, int] = {}
+
+    def _keep(self, stage_name: str, values):
+        kept = self.samples.setdefault(stage_name, array("d"))
+        kept.extend(values)
+        if self.max_samples and len(kept) > 2 * self.max_samples:
+            del kept[:-self.max_samples]
+
+    def _total(self, stage_name: str) -> list:
+        if stage_name not in self.totals:
+            self.totals[stage_name] = [0, 0.0, [0] * (len(PROM_BUCKETS) + 1)]
+        return self.totals[stage_name]
+
+    def observe(self, stage_name: str, seconds: float):
+        self._keep(stage_name, (seconds,))
+        total = self._total(stage_name)
+        total[0] += 1
+        total[1] += seconds
+        total[2][bisect_left(PROM_BUCKETS, seconds)] += 1
+
+    def count(self, event: str, n: int = 1):
+        self.counters[event] = self.counters.get(event, 0) + n
+
+    @contextmanager
+    def stage(self, stage_name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage_name, time.perf_counter() - started)
+
+    def add_usage(self, message):
+        # LangChain puts provider token counts on AIMessage.usage_metadata
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.tokens["input"] += usage.get("input_tokens", 0) or 0
+        self.tokens["output"] += usage.get("output_tokens", 0) or 0
+
+    def merge(self, other: "Metrics"):
+        for name, values in other.samples.items():
+            self._keep(name, values)
+        for name, (count, seconds, buckets) in other.totals.items():
+            total = self._total(name)
+            total[0] += count
+            total[1] += seconds
+            total[2] = [a + b for a, b in zip(total[2], buckets)]
+        for key in self.tokens:
+            self.tokens[key] += other.tokens[key]
+        for event, n in other.counters.items():
+            self.count(event, n)
+
+    def reset(self):
+        self.samples.clear()
+        self.totals.clear()
+        self.tokens = {"input": 0, "output": 0}
+        self.counters.clear()
+
+    def summary(self) -> dict:
+        stages = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            count, total, _ = self.totals[name]
+            stages[name] = {
+                "count": count,
+                "total_s": round(total, 6),
+                "mean_ms": round(1000 * total / count, 3) if count else 0.0,
+                "p50_ms": round(1000 * _percentile(ordered, 0.50), 3),
+                "p95_ms": round(1000 * _percentile(ordered, 0.95), 3),
+                "p99_ms": round(1000 * _percentile(ordered, 0.99), 3),
+                "max_ms": round(1000 * ordered[-1], 3) if ordered else 0.0,
+            }
+        return {"stages": stages, "tokens": dict(self.tokens), "counters": dict(self.counters)}
+
+    def write_json(self, path, **extra):
+        data = {**extra, **self.summary()}
+        Path(path).write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    def prometheus_text(self, run_id: str = "") -> str:
+        lines = [
+            "# HELP ticket_stage_seconds Latency of each ticket extraction stage.",
+            "# TYPE ticket_stage_seconds histogram",
+        ]
+        for name, (count, total, buckets) in sorted(self.totals.items()):
+            labels = f'stage="{name}",run_id="{run_id}"'
+            cumulative = 0
+            for le, n in zip(PROM_BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'ticket_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'ticket_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"ticket_stage_seconds_sum{{{labels}}} {total}")
+            lines.append(f"ticket_stage_seconds_count{{{labels}}} {count}")
+        lines += [
+            "# HELP ticket_llm_tokens_total Tokens reported by the model.",
+            "# TYPE ticket_llm_tokens_total counter",
+        ]
+        for kind, value in self.tokens.items():
+            lines.append(f'ticket_llm_tokens_total{{kind="{kind}",run_id="{run_id}"}} {value}')
+        if self.counters:
+            lines += [
+                "# HELP ticket_events_total Pipeline events (e.g. outputs repaired locally).",
+                "# TYPE ticket_events_total counter",
+            ]
+            for event, value in sorted(self.counters.items()):
+                lines.append(f'ticket_events_total{{event="{event}",run_id="{run_id}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, run_id: str = ""):
+        # write-then-rename so a textfile collector never reads a half file
+        tmp = Path(str(path) + ".tmp")
+        tmp.write_text(self.prometheus_text(run_id), encoding="utf-8")
+        tmp.replace(path)
+
+# process-wide instance; llm_chain and the runner both record into it
+metrics = Metrics()
+stage = metrics.stage
@@ -1,5 +1,6 @@
-from typing import Optional, Literal
-from pydantic import BaseModel, Field
+from functools import lru_cache
+from typing import List, Optional, Literal, Tuple, Type
+from pydantic import BaseModel, Field, create_model
 
 class Entities(BaseModel):
     amount: Optional[float] = Field(default=None, description="Numeric amount, e.g., 49.99")
@@ -14,4 +15,45 @@ class TicketExtraction(BaseModel):
     channel: Literal["phone","email","chat","unknown"]
     entities: Entities
     summary: str
-    status_suggestion: Literal["open","in_progress","resolved"]
\ No newline at end of file
+    status_suggestion: Literal["open","in_progress","resolved"]
+
+# --- cascade: cheaper tiers also say how sure they are ---
+class ScoredTicketExtraction(TicketExtraction):
+    confidence: float = Field(description="0-1: how sure the model is that every field is right")
+
+# --- packed mode: several tickets per structured-output call ---
+class PackedTicketExtraction(TicketExtraction):
+    source_id: str
+
+class PackedTicketBatch(BaseModel):
+    items: List[PackedTicketExtraction]
+
+# --- reduced schemas: fields the model is not asked for are filled in locally ---
+# --lazy-summary leaves out summary, --hybrid-entities leaves out entities.
+@lru_cache(maxsize=None)
+def reduced_model(omit: Tuple[str, ...], packed: bool = False) -> Type[BaseModel]:
+    """TicketExtraction without the `omit` fields; packed=True gives the matching `items` batch model."""
+    name = "Ticket" + "".join(f"No{field.title().replace('_', '')}" for field in omit)
+    fields = {field: (info.annotation, info) for field, info in TicketExtraction.model_fields.items()
+              if field not in omit}
+    if not packed:
+        return create_model(name, **fields)
+    item = create_model(f"Packed{name}", source_id=(str, ...), **fields)
+    return create_model(f"Packed{name}Batch", items=(List[item], ...))
+
+@lru_cache(maxsize=None)
+def scored_model(omit: Tuple[str, ...] = ()) -> Type[BaseModel]:
+    """ScoredTicketExtraction without the `omit` fields (cascade tiers in --hybrid-entities)."""
+    if not omit:
+        return ScoredTicketExtraction
+    base = reduced_model(omit)
+    return create_model(f"Scored{base.__name__}", __base__=base,
+                        confidence=(float, ScoredTicketExtraction.model_fields["confidence"]))
+
+# --- two-phase mode (--lazy-summary), phase two: summaries in a later batched call ---
+class TicketSummary(BaseModel):
+    source_id: str
+    summary: str
+
+class SummaryBatch(BaseModel):
+    items: List[TicketSummary]
@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Sidecar offset index for outputs.jsonl: (run_id, source_id) -> (byte offset,
+# length) of the record's line, in <outputs.jsonl>.idx.sqlite3 next to it.
+# JsonlSink adds every group commit's lines right after writing them, and
+# sync() indexes whatever was appended without it (runs made before the index
+# existed, --shards merges, --no-index runs). `indexed_bytes` is the end of the
+# contiguous prefix known to be indexed: the sink only moves it forward when
+# its batch starts exactly there, so lines another process appended in between
+# are picked up by the next sync() rather than skipped. Lookups go through
+# app.lookup, which reads the lines via mmap.
+
+BATCH = 10_000  # lines per transaction while syncing
+
+Entry = Tuple[str, str, int, int]  # run_id, source_id, offset, length
+
+def index_path(jsonl_path) -> Path:
+    path = Path(jsonl_path)
+    return path.with_name(path.name + ".idx.sqlite3")
+
+_DECODER = json.JSONDecoder()
+_HEAD = b'{"run_meta":'
+
+def record_key(line: bytes) -> Optional[Tuple[str, str]]:
+    """(run_id, source_id) of one outputs.jsonl line, decoding only run_meta when it can."""
+    try:
+        text = line.decode("utf-8")
+        if line.startswith(_HEAD):
+            start = len(_HEAD)
+            while text[start] == " ":
+                start += 1
+            meta, _ = _DECODER.raw_decode(text, start)
+        else:
+            meta = json.loads(text)["run_meta"]
+        return str(meta["run_id"]), str(meta["source_id"])
+    except (ValueError, KeyError, TypeError, IndexError):
+        return None  # torn or foreign line
+
+class OffsetIndex:
+    def __init__(self, jsonl_path, path=None):
+        self.jsonl_path = Path(jsonl_path)
+        self.path = Path(path) if path else index_path(jsonl_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # autocommit; writes are grouped in explicit transactions
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None, timeout=30.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " run_id TEXT NOT NULL,"
+            " source_id TEXT NOT NULL,"
+            " offset INTEGER NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " PRIMARY KEY (run_id, source_id)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_source ON records(source_id, offset)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('indexed_bytes', 0), ('inode', 0)")
+
+    def _meta(self, key: str) -> int:
+        return self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    @property
+    def indexed_bytes(self) -> int:
+        return self._meta("indexed_bytes")
+
+    def add(self, entries: List[Entry], start: int, end: int):
+        """Index lines the caller wrote at [start, end) of the file."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", entries)
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'indexed_bytes' AND value = ?", (end, start))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def sync(self) -> int:
+        """Index every complete line past indexed_bytes; rebuilds if the file was replaced. Returns lines indexed."""
+        try:
+            st = os.stat(self.jsonl_path)
+        except FileNotFoundError:
+            return 0
+        offset = self.indexed_bytes
+        if st.st_size < offset or self._meta("inode") not in (0, st.st_ino):
+            # truncated or replaced: the old offsets point into some other file
+            self.conn.execute("DELETE FROM records")
+            self.conn.execute("UPDATE meta SET value = 0 WHERE key = 'indexed_bytes'")
+            offset = 0
+        n, entries = 0, []
+        with open(self.jsonl_path, "rb") as f:
+            f.seek(offset)
+            batch_start = offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail of a run still writing or killed; next sync
+                key = record_key(line)
+                if key is not None:
+                    entries.append((*key, offset, len(line)))
+                offset += len(line)
+                if len(entries) >= BATCH:
+                    n += self._commit_sync(entries, batch_start, offset, st.st_ino)
+                    entries, batch_start = [], offset
+        n += self._commit_sync(entries, batch_start, offset, st.st_ino)
+        return n
+
+    def _commit_sync(self, entries: List[Entry], start: int, end: int, inode: int) -> int:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", entries)
+            # a sink may have moved the mark past `start` meanwhile; never move it back
+            self.conn.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'indexed_bytes'", (end,))
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'inode'", (inode,))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return len(entries)
+
+    def find(self, source_id: str, run_id: Optional[str] = None) -> Optional[Tuple[str, int, int]]:
+        """(run_id, offset, length) of source_id's record in run_id, or its most recent one."""
+        if run_id is not None:
+            row = self.conn.execute(
+                "SELECT run_id, offset, length FROM records WHERE run_id = ? AND source_id = ?",
+                (run_id, source_id),
+            ).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT run_id, offset, length FROM records WHERE source_id = ? ORDER BY offset DESC LIMIT 1",
+                (source_id,),
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def find_all(self, source_id: str) -> List[Tuple[str, int, int]]:
+        """Every run's record for source_id, oldest first."""
+        return [tuple(row) for row in self.conn.execute(
+            "SELECT run_id, offset, length FROM records WHERE source_id = ? ORDER BY offset", (source_id,)
+        )]
+
+    def stats(self) -> dict:
+        (records,) = self.conn.execute("SELECT COUNT(*) FROM records").fetchone()
+        (runs,) = self.conn.execute("SELECT COUNT(DISTINCT run_id) FROM records").fetchone()
+        return {"records": records, "runs": runs, "indexed_bytes": self.indexed_bytes}
+
+    def close(self):
+        self.conn.close()
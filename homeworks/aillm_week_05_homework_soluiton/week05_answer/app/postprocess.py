@@ -0,0 +1,153 @@
+import math
+import re
+from typing import List, Optional
+
+from app.lazy import lazy_import
+
+# only the columnar parse_amounts needs these
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Clean-up of entity values before validation.
+# The model copies amounts, invoice periods and ticket ids out of the ticket as
+# they were written ("1.250,50 TL", "Mart 2024", "#45721"). These turn them into
+# canonical values and read Turkish number grouping (dot for thousands, comma
+# for decimals) correctly. normalize_entities runs the per-value versions,
+# which `python -m app.bench_normalize` shows to be faster than pandas columns
+# at every batch size the runner produces (each pandas op carries a fixed
+# cost). Amounts also have a columnar version, parse_amounts, for data that
+# already lives in a Series (the pre-classifier's blocks).
+
+DEFAULT_LOCALE = "tr"
+LOCALES = ("tr", "en")
+
+NUMBER = r"([-+]?\d(?:[\d.,]*\d)?)"
+GROUPED = r"^[-+]?\d{1,3}(?:[.,]\d{3})+$"  # 1.250 / 1,250 / 1.250.000
+
+MONTHS = {
+    "ocak": 1, "subat": 2, "mart": 3, "nisan": 4, "mayis": 5, "haziran": 6,
+    "temmuz": 7, "agustos": 8, "eylul": 9, "ekim": 10, "kasim": 11, "aralik": 12,
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+}
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+# tried in order; the first that matches decides
+PERIOD_PATTERNS = (
+    rf"\b(?P<month>{_MONTH})\b\W*(?P<year>\d{{4}})",  # mart 2024
+    rf"(?P<year>\d{{4}})\W*\b(?P<month>{_MONTH})\b",  # 2024 mart
+    r"^(?P<month>\d{1,2})[./-](?P<year>\d{4})$",      # 03/2024
+    r"^(?P<year>\d{4})[./-](?P<month>\d{1,2})$",      # 2024-03
+)
+# Turkish casing (I -> ı, İ -> i) first, then fold to ASCII so "MAYIS", "Mayıs" and "mayis" agree
+_TR_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+_FOLD = str.maketrans("şğıüöçâî", "sgiuocai")
+
+_NUMBER_RE = re.compile(NUMBER)
+_GROUPED_RE = re.compile(GROUPED)
+_PERIOD_RES = [re.compile(p) for p in PERIOD_PATTERNS]
+
+def _check_locale(locale: str):
+    if locale not in LOCALES:
+        raise ValueError(f"unknown locale {locale!r}, expected one of {LOCALES}")
+
+def _is_number(value) -> bool:
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and not (isinstance(value, float) and math.isnan(value)))
+
+def _is_text(value) -> bool:
+    return isinstance(value, str)
+
+def fold(text: str) -> str:
+    """Lower-case with Turkish casing rules, folded to ASCII ("MAYIS", "Mayıs" -> "mayis")."""
+    return text.translate(_TR_UPPER).lower().translate(_FOLD)
+
+# --- per value ---
+
+def parse_amount(value, locale: str = DEFAULT_LOCALE) -> Optional[float]:
+    if _is_number(value):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    m = _NUMBER_RE.search(value)
+    if not m:
+        return None
+    raw = m.group(1)
+    n_dot, n_comma = raw.count("."), raw.count(",")
+    dot_last = raw.rfind(".") > raw.rfind(",")
+    grouped = _GROUPED_RE.match(raw) is not None
+    # a lone separator is a decimal point unless it groups thousands in this locale
+    lone_comma_dec, lone_dot_dec = (True, not grouped) if locale == "tr" else (not grouped, True)
+    if n_comma == 1 and (lone_comma_dec if n_dot == 0 else not dot_last):
+        return float(raw.replace(".", "").replace(",", "."))
+    if n_dot == 1 and (lone_dot_dec if n_comma == 0 else dot_last):
+        return float(raw.replace(",", ""))
+    return float(raw.replace(",", "").replace(".", ""))
+
+def normalize_period(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    if not text:
+        return None
+    folded = fold(text)
+    for pattern in _PERIOD_RES:
+        m = pattern.search(folded)
+        if m:
+            month = MONTHS.get(m["month"]) or int(m["month"])
+            return f"{m['year']}-{month:02d}" if 1 <= month <= 12 else text
+    return text
+
+def normalize_ticket_id(value) -> Optional[str]:
+    if _is_number(value):
+        return str(int(value)) if float(value).is_integer() else str(value)
+    if not isinstance(value, str):
+        return None
+    return value.strip().lstrip("#").strip().upper() or None
+
+# --- columnar ---
+
+def _mask(values: "pd.Series", test) -> "pd.Series":
+    return values.map(test).astype(bool)
+
+def parse_amounts(values: "pd.Series", locale: str = DEFAULT_LOCALE) -> "pd.Series":
+    """Columnar parse_amount: float Series, NaN where there is no amount."""
+    values = pd.Series(values, dtype=object)
+    is_text = _mask(values, _is_text)
+    out = pd.to_numeric(values.where(_mask(values, _is_number)), errors="coerce").astype(float)
+    if not is_text.any():
+        return out
+
+    raw = values[is_text].astype(str).str.extract(NUMBER, expand=False)
+    raw = raw[raw.notna()]
+    n_dot = raw.str.count(r"\.")
+    n_comma = raw.str.count(",")
+    dot_last = raw.str.rfind(".") > raw.str.rfind(",")
+    grouped = raw.str.match(GROUPED)
+
+    if locale == "tr":
+        lone_comma_dec, lone_dot_dec = True, ~grouped
+    else:
+        lone_comma_dec, lone_dot_dec = ~grouped, True
+    comma_dec = (n_comma == 1) & np.where(n_dot == 0, lone_comma_dec, ~dot_last)
+    dot_dec = (n_dot == 1) & np.where(n_comma == 0, lone_dot_dec, dot_last) & ~comma_dec
+
+    canon = raw.str.replace(",", "", regex=False).str.replace(".", "", regex=False)
+    canon[dot_dec] = raw[dot_dec].str.replace(",", "", regex=False)
+    canon[comma_dec] = raw[comma_dec].str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    out[canon.index] = pd.to_numeric(canon, errors="coerce").astype(float)
+    return out
+
+def normalize_entities(items: List[dict], locale: str = DEFAULT_LOCALE) -> List[dict]:
+    """Normalize `entities` of raw (pre-validation) extraction dicts in place; returns `items`."""
+    _check_locale(locale)
+    for item in items:
+        entities = item.get("entities") if isinstance(item, dict) else None
+        if not isinstance(entities, dict):
+            continue
+        if entities.get("amount") is not None:
+            entities["amount"] = parse_amount(entities["amount"], locale)
+        if entities.get("invoice_period") is not None:
+            entities["invoice_period"] = normalize_period(entities["invoice_period"])
+        if entities.get("ticket_id") is not None:
+            entities["ticket_id"] = normalize_ticket_id(entities["ticket_id"])
+    return items
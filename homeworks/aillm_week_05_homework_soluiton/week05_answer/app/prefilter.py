@@ -0,0 +1,127 @@
+import re
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from app.entities import AMOUNT, extract_entities
+from app.models import TicketExtraction
+from app.postprocess import parse_amounts
+
+# Deterministic pre-classifier for the "obvious" fields.
+# Works on a whole block of tickets with pandas string ops (one regex pass per
+# pattern per block, not per row). Every field comes with a confidence; when all
+# of them clear the threshold the ticket is answered locally and the LLM call is
+# skipped. Rules are deliberately conservative: an absent signal is low
+# confidence, so anything ambiguous still goes to the model.
+
+# explicit "I contacted you via X" phrasings -> high confidence
+CHANNEL_STRONG = {
+    "phone": r"telefon(?:la|dan)\b|çağrı merkezin(?:i|e|den) aradım|aradım",
+    "email": r"e-?posta(?:yla|ile|dan)\b|e-?mail(?:le|den)\b|mail(?:le|den) (?:yazdım|bildirdim|ilettim)",
+    "chat": r"canlı sohbet(?:ten|te|ten yazdım)?\b|canlı sohbet üzerinden|chat(?:ten|ten yazdım)\b",
+}
+# bare mentions of a channel word -> weak evidence only
+CHANNEL_WEAK = {
+    "phone": r"telefon|çağrı merkezi",
+    "email": r"e-?posta|e-?mail|\bmail\b",
+    "chat": r"canlı destek|sohbet|\bchat\b",
+}
+
+URGENCY_HIGH = r"\bacil|derhal|hemen|kritik|önemli bir|mağdur|tamamen kesildi|işimi etkiliyor"
+
+ISSUE_PATTERNS = {
+    "billing": r"fatura|ücret|ödeme|iade|tahsil|çekim|geri ödeme|\d\s*(?:tl|₺)\b",
+    "account": r"hesab|şifre|parola|giriş yap|kilitlen|doğrulama|abonelik",
+    "technical": r"internet|modem|router|uygulama|çök|bağlantı|kesinti|yavaş|voip|hız",
+}
+
+# mentions of entities the rules do not fill (ticket number, period, device, move)
+ENTITY_HINTS = (
+    r"bilet|numara|ticket|dönem|geçen ay|bu ay|son fatura|modem|router|telefonum|cihaz|"
+    r"tablet|bilgisayar|adres|nakil|taşın"
+)
+
+FIELDS = ("channel", "urgency", "issue_type", "amount", "entities")
+
+def classify(texts: pd.Series) -> pd.DataFrame:
+    """Rule-based guesses + confidences for a block of ticket texts."""
+    low = texts.fillna("").str.lower()
+    out = pd.DataFrame(index=texts.index)
+
+    # channel: first strong match wins, else a single weak match, else unknown
+    out["channel"] = "unknown"
+    out["channel_conf"] = 0.5
+    weak_hits = pd.DataFrame({ch: low.str.contains(p, regex=True) for ch, p in CHANNEL_WEAK.items()})
+    single_weak = weak_hits.sum(axis=1) == 1
+    for ch in CHANNEL_WEAK:
+        mask = single_weak & weak_hits[ch]
+        out.loc[mask, "channel"] = ch
+        out.loc[mask, "channel_conf"] = 0.6
+    for ch, p in CHANNEL_STRONG.items():
+        mask = low.str.contains(p, regex=True) & (out["channel_conf"] < 0.95)
+        out.loc[mask, "channel"] = ch
+        out.loc[mask, "channel_conf"] = 0.95
+
+    # urgency: only "high" has a reliable lexical signal
+    high = low.str.contains(URGENCY_HIGH, regex=True)
+    out["urgency"] = high.map({True: "high", False: "medium"})
+    out["urgency_conf"] = high.map({True: 0.9, False: 0.4})
+
+    # issue_type: exactly one class matching is a confident call
+    issue_hits = pd.DataFrame({k: low.str.contains(p, regex=True) for k, p in ISSUE_PATTERNS.items()})
+    n_hits = issue_hits.sum(axis=1)
+    out["issue_type"] = issue_hits.idxmax(axis=1).where(n_hits > 0, "general")
+    out["issue_type_conf"] = n_hits.map(lambda n: 0.85 if n == 1 else (0.5 if n > 1 else 0.3))
+
+    # amount: a currency-tagged number is near-certain; no number means null
+    raw_amount = low.str.extract(AMOUNT, expand=False)
+    out["amount"] = parse_amounts(raw_amount)
+    out["amount_conf"] = 0.95
+    n_amounts = low.str.count(AMOUNT)
+    out.loc[n_amounts > 1, "amount_conf"] = 0.4  # several amounts: which one?
+
+    # entities the rules don't cover must be absent for a local answer
+    hinted = low.str.contains(ENTITY_HINTS, regex=True)
+    out["entities_conf"] = hinted.map({True: 0.3, False: 0.9})
+    return out
+
+def _summary(text: str, limit: int = 160) -> str:
+    first = re.split(r"(?<=[.!?;])\s", text.strip(), maxsplit=1)[0]
+    return first if len(first) <= limit else first[:limit - 1].rstrip() + "…"
+
+def resolve(rows: List[Tuple[str, str]], threshold: float = 0.8,
+            local_entities: bool = False) -> Dict[str, dict]:
+    """Returns {source_id: TicketExtraction payload} for rows the rules fully cover.
+
+    local_entities (--hybrid-entities): entities come from app.entities like they
+    do for LLM answers, so only the top-level fields need to clear the threshold.
+    """
+    if not rows:
+        return {}
+    ids = [sid for sid, _ in rows]
+    texts = pd.Series([text for _, text in rows])
+    guess = classify(texts)
+    fields = [f for f in FIELDS if f not in ("amount", "entities")] if local_entities else FIELDS
+    confident = (guess[[f"{f}_conf" for f in fields]] >= threshold).all(axis=1)
+
+    resolved = {}
+    for i in guess.index[confident]:
+        g = guess.loc[i]
+        amount = g["amount"]
+        entities = extract_entities(texts[i]) if local_entities else {
+            "amount": None if pd.isna(amount) else float(amount),
+            "invoice_period": None,
+            "ticket_id": None,
+            "device": None,
+            "address_move": None,
+        }
+        payload = {
+            "issue_type": g["issue_type"],
+            "urgency": g["urgency"],
+            "channel": g["channel"],
+            "entities": entities,
+            "summary": _summary(texts[i]),
+            "status_suggestion": "open",  # a freshly filed ticket is open
+        }
+        resolved[ids[i]] = TicketExtraction.model_validate(payload).model_dump()
+    return resolved
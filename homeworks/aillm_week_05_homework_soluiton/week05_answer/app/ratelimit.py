@@ -0,0 +1,299 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+# Client-side backpressure for Gemini calls:
+#   - TokenBucket: requests/minute + tokens/minute budget. In memory by default,
+#     or kept in a small SQLite file so several worker processes share one budget.
+#   - AIMDConcurrency: in-flight limit that grows by ~1 per window of successes
+#     and halves on a throttling signal (429 / RESOURCE_EXHAUSTED).
+# A throttle seen by any process drains the shared bucket and is broadcast
+# through the file, so every process backs off instead of hitting 429s in turn.
+
+# An HTTP status in a message only counts where a status goes: at the start
+# ("429 RESOURCE_EXHAUSTED: ..."), after a colon ("...to Gemini: 400 ...") or
+# after http/status/code. "ticket 500 TL is internal" is not a status.
+STATUS_RE = re.compile(r"(?:^|:\s*|\b(?:http|status|code)\W{0,3})([1-5]\d\d)\b", re.I)
+# gRPC status names, upper-case as Google's errors spell them
+STATUS_NAME_RE = re.compile(r"\b([A-Z]+(?:_[A-Z]+)+|[A-Z]{5,})\b")
+THROTTLE_STATUSES = {"RESOURCE_EXHAUSTED"}
+THROTTLE_PHRASES = ("rate limit exceeded", "too many requests", "quota exceeded")
+
+def error_chain(e: BaseException, depth: int = 5):
+    """e and the exceptions it was raised from (LangChain wraps the client's errors with `from`).
+
+    Only explicit causes: an error raised while handling another is not that error.
+    """
+    while e is not None and depth > 0:
+        yield e
+        e = e.__cause__
+        depth -= 1
+
+def status_code(e: BaseException):
+    """HTTP status carried by the error or one it wraps: attributes first, then the message."""
+    chain = list(error_chain(e))
+    for err in chain:
+        for code in (getattr(err, "status_code", None), getattr(err, "code", None),
+                     getattr(getattr(err, "response", None), "status_code", None)):
+            if isinstance(code, int) and 100 <= code <= 599:
+                return code
+    for err in chain:
+        m = STATUS_RE.search(str(err))
+        if m:
+            return int(m.group(1))
+    return None
+
+def status_names(e: BaseException) -> set:
+    return {name for err in error_chain(e) for name in STATUS_NAME_RE.findall(str(err))}
+
+def is_throttle_error(e: BaseException) -> bool:
+    if any(type(err).__name__ in ("ResourceExhausted", "TooManyRequests") for err in error_chain(e)):
+        return True
+    if status_code(e) == 429 or status_names(e) & THROTTLE_STATUSES:
+        return True
+    return any(phrase in str(err).lower() for err in error_chain(e) for phrase in THROTTLE_PHRASES)
+
+class TokenBucket:
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, state_path=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._conn = None
+        if state_path is not None:
+            Path(state_path).parent.mkdir(parents=True, exist_ok=True)
+            # isolation_level=None so BEGIN IMMEDIATE below is the cross-process lock
+            self._conn = sqlite3.connect(str(state_path), isolation_level=None,
+                                         timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                " id INTEGER PRIMARY KEY CHECK (id = 1),"
+                " requests REAL, tokens REAL, updated REAL, last_throttle REAL)"
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO bucket VALUES (1, ?, ?, ?, 0)",
+                (rpm or 0.0, tpm or 0.0, time.time()),
+            )
+        else:
+            self._state = [rpm or 0.0, tpm or 0.0, time.time(), 0.0]
+
+    @property
+    def shared(self) -> bool:
+        """True when the state lives in SQLite, where BEGIN IMMEDIATE may wait for another process."""
+        return self._conn is not None
+
+    def _load(self):
+        if self._conn is None:
+            return list(self._state)
+        self._conn.execute("BEGIN IMMEDIATE")
+        return list(self._conn.execute(
+            "SELECT requests, tokens, updated, last_throttle FROM bucket WHERE id = 1"
+        ).fetchone())
+
+    def _store(self, state):
+        if self._conn is None:
+            self._state = state
+            return
+        self._conn.execute(
+            "UPDATE bucket SET requests = ?, tokens = ?, updated = ?, last_throttle = ? WHERE id = 1",
+            state,
+        )
+        self._conn.execute("COMMIT")
+
+    def _refill(self, state, now: float):
+        requests, tokens, updated, last_throttle = state
+        elapsed = max(0.0, now - updated)
+        if self.rpm:
+            requests = min(self.rpm, requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            tokens = min(self.tpm, tokens + elapsed * self.tpm / 60.0)
+        return [requests, tokens, now, last_throttle]
+
+    def try_acquire(self, tokens: int = 0):
+        """Returns (seconds to wait, 0.0 if granted; last throttle timestamp)."""
+        with self._lock:
+            now = time.time()
+            state = self._refill(self._load(), now)
+            if self.tpm:
+                tokens = min(tokens, self.tpm)  # a single huge request must still fit eventually
+            wait = 0.0
+            if self.rpm and state[0] < 1:
+                wait = max(wait, (1 - state[0]) * 60.0 / self.rpm)
+            if self.tpm and state[1] < tokens:
+                wait = max(wait, (tokens - state[1]) * 60.0 / self.tpm)
+            if wait == 0.0:
+                if self.rpm:
+                    state[0] -= 1
+                if self.tpm:
+                    state[1] -= tokens
+            self._store(state)
+            return wait, state[3]
+
+    def signal_throttle(self):
+        with self._lock:
+            state = self._refill(self._load(), time.time())
+            # drain so every sharer pauses until the bucket refills
+            state[0] = min(state[0], 0.0)
+            state[1] = min(state[1], 0.0)
+            state[3] = time.time()
+            self._store(state)
+
+class AIMDConcurrency:
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 increase: float = 1.0, decrease: float = 0.5, cooldown: float = 2.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown  # one burst of 429s only halves the limit once
+        self.in_flight = 0
+        self.throttles = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_enter(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def enter(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait(0.1)
+            self.in_flight += 1
+
+    async def aenter(self):
+        while not self.try_enter():
+            await asyncio.sleep(0.01)
+
+    def leave(self, throttled: bool = False, counted: bool = True):
+        """counted=False frees the slot without feeding the outcome back (e.g. a cancelled call)."""
+        with self._cond:
+            self.in_flight -= 1
+            if counted and throttled:
+                self.backoff()
+            elif counted:
+                # +increase per `limit` successes, i.e. ~+1 per window
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+
+    def backoff(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown:
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            self._last_decrease = now
+            self.throttles += 1
+
+class RateLimiter(BaseRateLimiter):
+    """Token bucket + AIMD concurrency around one model call.
+
+    Use ``slot()`` / ``aslot()`` around a call so throttling outcomes feed back
+    into the concurrency limit. It is also a LangChain ``BaseRateLimiter``, so
+    other chains can pass it as ``rate_limiter=`` to their chat model to share
+    the request budget (without the AIMD feedback).
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 state_path=None, initial_concurrency: int = 4, max_concurrency: int = 64):
+        self.bucket = TokenBucket(rpm, tpm, state_path)
+        self.aimd = AIMDConcurrency(initial=min(initial_concurrency, max_concurrency),
+                                    max_limit=max_concurrency)
+        self.waited = 0.0
+        self._seen_throttle = time.time()  # ignore throttles from before this process started
+
+    def _check_shared_throttle(self, last_throttle: float):
+        if last_throttle > self._seen_throttle:
+            self._seen_throttle = last_throttle
+            self.aimd.backoff()
+
+    def acquire(self, *, blocking: bool = True, tokens: int = 0) -> bool:
+        while True:
+            wait, last_throttle = self.bucket.try_acquire(tokens)
+            self._check_shared_throttle(last_throttle)
+            if wait == 0.0:
+                return True
+            if not blocking:
+                return False
+            self.waited += wait
+            time.sleep(wait)
+
+    async def _atry_acquire(self, tokens: int):
+        # the shared bucket takes a cross-process SQLite lock, which can block
+        # for a while; wait for it on a thread instead of stalling the event loop
+        if self.bucket.shared:
+            return await asyncio.to_thread(self.bucket.try_acquire, tokens)
+        return self.bucket.try_acquire(tokens)
+
+    async def aacquire(self, *, blocking: bool = True, tokens: int = 0) -> bool:
+        while True:
+            wait, last_throttle = await self._atry_acquire(tokens)
+            self._check_shared_throttle(last_throttle)
+            if wait == 0.0:
+                return True
+            if not blocking:
+                return False
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    def _record(self, e: Optional[BaseException]):
+        throttled = e is not None and is_throttle_error(e)
+        if throttled:
+            self.bucket.signal_throttle()
+        self.aimd.leave(throttled)
+
+    async def _arecord(self, e: Optional[BaseException]):
+        throttled = e is not None and is_throttle_error(e)
+        if throttled:
+            if self.bucket.shared:
+                await asyncio.to_thread(self.bucket.signal_throttle)
+            else:
+                self.bucket.signal_throttle()
+        self.aimd.leave(throttled)
+
+    @contextmanager
+    def slot(self, tokens: int = 0):
+        self.aimd.enter()
+        try:
+            self.acquire(tokens=tokens)
+            yield
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            # the call never finished, so it says nothing about the provider's load
+            self.aimd.leave(counted=False)
+            raise
+        except BaseException as e:
+            self._record(e)
+            raise
+        else:
+            self._record(None)
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int = 0):
+        await self.aimd.aenter()
+        try:
+            await self.aacquire(tokens=tokens)
+            yield
+        except asyncio.CancelledError:
+            # the call never finished, so it says nothing about the provider's load
+            self.aimd.leave(counted=False)
+            raise
+        except BaseException as e:
+            await self._arecord(e)
+            raise
+        else:
+            await self._arecord(None)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": round(self.aimd.limit, 2),
+            "throttles": self.aimd.throttles,
+            "waited_seconds": round(self.waited, 2),
+        }
@@ -0,0 +1,136 @@
+import csv
+import io
+import os
+import sys
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+REQUIRED_COLUMNS = ("user_id", "sikayet")
+
+# ticket texts can be long; the csv default (128 KiB) is too small for some exports
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+class MissingColumnsError(ValueError):
+    def __init__(self, found: List[str]):
+        super().__init__(f"Expected columns user_id and sikayet. Found: {found}")
+        self.found = found
+
+def _rows(f, reader, indices: List[int]) -> Iterator[tuple]:
+    width = max(i for i in indices if i >= 0) + 1
+    with f:
+        for record in reader:
+            if not record:
+                continue  # blank line
+            if len(record) < width:
+                record = record + [""] * (width - len(record))
+            yield tuple(record[i] if i >= 0 else "" for i in indices)
+
+def _open(csv_path: str):
+    f = open(csv_path, newline="", encoding="utf-8-sig")
+    reader = csv.reader(f)
+    header = next(reader, [])
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        f.close()
+        raise MissingColumnsError(header)
+    return f, reader, header
+
+def check_columns(csv_path: str):
+    """Raise MissingColumnsError unless the header has the required columns; reads nothing else."""
+    f, _, _ = _open(csv_path)
+    f.close()
+
+def stream_rows(csv_path: str, extra_columns: Sequence[str] = (),
+                byte_range: Optional[Tuple[int, int]] = None) -> Iterator[tuple]:
+    """Yield (source_id, ticket_text, *extra_columns) one CSV row at a time.
+
+    Only the header is validated up front (eagerly, so a bad file fails before
+    the first LLM call); rows are never materialized, so memory stays flat no
+    matter how large the export is. Optional extra columns the file lacks come
+    back as "". With `byte_range` (from byte_ranges()) only the records in
+    [start, end) are read.
+    """
+    f, reader, header = _open(csv_path)
+    if byte_range is not None:
+        f.close()
+        f = io.TextIOWrapper(io.BufferedReader(_ByteRange(csv_path, *byte_range)), encoding="utf-8", newline="")
+        reader = csv.reader(f)
+    columns = [*REQUIRED_COLUMNS, *extra_columns]
+    return _rows(f, reader, [header.index(c) if c in header else -1 for c in columns])
+
+# --- byte ranges: let --shards workers read their own part of the file ---
+BLOCK = 1 << 20
+
+class _ByteRange(io.RawIOBase):
+    """Raw file view that ends at `end`, so csv.reader stops at the range boundary."""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._f = open(path, "rb")
+        self._f.seek(start)
+        self._left = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self._left)
+        if n <= 0:
+            return 0
+        n = self._f.readinto(memoryview(b)[:n])
+        self._left -= n
+        return n
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+class _RecordScanner:
+    """Finds record starts in a CSV file, skipping newlines inside quoted fields.
+
+    A newline ends a record when the number of quotes before it is even ("" is
+    an escaped quote, so it never changes the parity). Quotes are counted with
+    bytes.count over whole blocks, so a scan runs at memory speed.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.pos = 0  # always a record start
+        self.quotes = 0  # quotes in [0, pos)
+
+    def next_start(self, target: int) -> int:
+        """Offset of the first record that starts at or after `target` (file size at EOF)."""
+        if target <= self.pos:
+            return self.pos
+        f, pos, quotes = self.f, self.pos, self.quotes
+        f.seek(pos)
+        # a record starting at `target` would follow a newline at target - 1
+        while pos < target - 1:
+            block = f.read(min(BLOCK, target - 1 - pos))
+            if not block:
+                break
+            quotes += block.count(b'"')
+            pos += len(block)
+        while block := f.read(BLOCK):
+            i = 0
+            while (nl := block.find(b"\n", i)) >= 0:
+                quotes += block.count(b'"', i, nl)
+                i = nl + 1
+                if quotes % 2 == 0:
+                    self.pos, self.quotes = pos + i, quotes
+                    return self.pos
+            quotes += block.count(b'"', i)
+            pos += len(block)
+        self.pos, self.quotes = pos, quotes
+        return pos
+
+def byte_ranges(csv_path: str, n: int) -> List[Tuple[int, int]]:
+    """Split the rows after the header into n [start, end) byte ranges of about equal size.
+
+    Every range starts and ends on a record boundary; a range can be empty when
+    the file has fewer records than n.
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, "rb") as f:
+        scanner = _RecordScanner(f)
+        body = scanner.next_start(1)  # end of the header record
+        cuts = [body] + [scanner.next_start(body + (size - body) * k // n) for k in range(1, n)] + [size]
+    return list(zip(cuts, cuts[1:]))
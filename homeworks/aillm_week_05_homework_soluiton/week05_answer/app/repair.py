@@ -0,0 +1,111 @@
+import difflib
+import json
+import re
+from typing import Any, Literal, get_args, get_origin
+
+from app.models import Entities, TicketExtraction
+from app.postprocess import normalize_entities
+
+# Local repair of near-miss model output, tried before paying for another call.
+# Handles the usual misses: JSON wrapped in prose or code fences, trailing
+# commas, keys in the wrong case, enum values in the wrong case/spelling or a
+# synonym ("Urgent", "e-mail", "In Progress", "yüksek"), a missing entities
+# object, and entity values of the wrong type ("200 TL", 45721, "evet").
+# Whatever still fails validation afterwards raises RepairError, which the
+# runner treats as worth one more call.
+
+class RepairError(ValueError):
+    """Model output that local repair could not turn into a valid TicketExtraction."""
+
+ENUM_SYNONYMS = {
+    # urgency
+    "urgent": "high", "critical": "high", "asap": "high", "normal": "medium", "moderate": "medium",
+    "yüksek": "high", "acil": "high", "orta": "medium", "düşük": "low",
+    # channel
+    "e-mail": "email", "mail": "email", "e-posta": "email", "telephone": "phone", "call": "phone",
+    "telefon": "phone", "live chat": "chat", "canlı sohbet": "chat", "sohbet": "chat", "none": "unknown",
+    # issue_type
+    "fatura": "billing", "payment": "billing", "teknik": "technical", "hesap": "account",
+    "genel": "general", "other": "general",
+    # status_suggestion
+    "new": "open", "açık": "open", "pending": "in_progress", "ongoing": "in_progress",
+    "closed": "resolved", "done": "resolved", "çözüldü": "resolved",
+}
+TRUE_WORDS = {"true", "yes", "evet", "var", "1"}
+FALSE_WORDS = {"false", "no", "hayır", "hayir", "yok", "0"}
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S)
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+def _enum_fields(model) -> dict:
+    return {name: get_args(field.annotation) for name, field in model.model_fields.items()
+            if get_origin(field.annotation) is Literal}
+
+ENUMS = _enum_fields(TicketExtraction)
+
+def extract_json(text: str) -> Any:
+    """First JSON object or array in `text`, ignoring code fences and surrounding prose."""
+    m = _FENCE.search(text)
+    if m:
+        text = m.group(1)
+    decoder = json.JSONDecoder()
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", text)):
+        for i, ch in enumerate(candidate):
+            if ch in "{[":
+                try:
+                    return decoder.raw_decode(candidate, i)[0]
+                except json.JSONDecodeError:
+                    continue
+    raise RepairError("no JSON object in model output")
+
+def coerce_enum(value, allowed) -> Any:
+    if not isinstance(value, str):
+        return value
+    raw = value.strip().lower()
+    key = re.sub(r"[\s-]+", "_", raw)
+    if key in allowed:
+        return key
+    if ENUM_SYNONYMS.get(raw) in allowed:
+        return ENUM_SYNONYMS[raw]
+    close = difflib.get_close_matches(key, allowed, n=1, cutoff=0.75)
+    return close[0] if close else value
+
+def coerce_bool(value) -> Any:
+    if isinstance(value, bool) or value is None:
+        return value
+    word = str(value).strip().lower()
+    if word in TRUE_WORDS:
+        return True
+    if word in FALSE_WORDS:
+        return False
+    return value
+
+def repair_payload(data) -> dict:
+    """A repaired copy of one raw extraction dict (the input is left as is)."""
+    if not isinstance(data, dict):
+        raise RepairError(f"expected a JSON object, got {type(data).__name__}")
+    # keys in another case or spacing ("Issue Type") map onto the field names
+    fixed = {}
+    for key, value in data.items():
+        name = re.sub(r"[\s-]+", "_", str(key).strip().lower())
+        if name in TicketExtraction.model_fields and (name not in fixed or key == name):
+            fixed[name] = value
+
+    for name, allowed in ENUMS.items():
+        if name in fixed:
+            fixed[name] = coerce_enum(fixed[name], allowed)
+    if fixed.get("summary") is not None and not isinstance(fixed["summary"], str):
+        fixed["summary"] = str(fixed["summary"])
+
+    entities = fixed.get("entities")
+    entities = dict(entities) if isinstance(entities, dict) else {}
+    entities = {k: v for k, v in entities.items() if k in Entities.model_fields}
+    for name in ("invoice_period", "device"):
+        value = entities.get(name)
+        if value is not None and not isinstance(value, str):
+            entities[name] = str(value)
+    if "address_move" in entities:
+        entities["address_move"] = coerce_bool(entities["address_move"])
+    fixed["entities"] = entities
+    normalize_entities([fixed])
+    return fixed
@@ -0,0 +1,107 @@
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import time
+from typing import Any, List, Optional
+
+from pydantic import ValidationError
+
+from app.ratelimit import error_chain, is_throttle_error, status_code, status_names
+from app.repair import RepairError
+
+# Retry policy for extraction calls.
+#   - classify_error: throttling, 5xx and timeouts are worth another try, and so
+#     is output that local repair (app.repair) could not fix, since the model
+#     may answer differently; other schema/parse failures and 4xx won't change.
+#     It goes by exception type, then status code, then whole gRPC status
+#     names, never by words that merely appear somewhere in the message.
+#   - backoff: exponential with jitter, so rows that failed together don't
+#     come back together.
+#   - RetryBudget: retries may add at most `ratio` x first attempts (plus a
+#     small floor), so a broken backend can't multiply the run's traffic.
+#   - RetryQueue: due-time heap the serial runner uses to park failed rows and
+#     keep reading new ones instead of sleeping.
+
+RETRYABLE = "retryable"
+PERMANENT = "permanent"
+
+TRANSIENT_STATUSES = {"UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED", "ABORTED"}
+PERMANENT_STATUSES = {"INVALID_ARGUMENT", "PERMISSION_DENIED", "UNAUTHENTICATED", "NOT_FOUND",
+                      "FAILED_PRECONDITION"}
+# transport errors from httpx/requests/grpc that don't subclass the builtins
+TRANSIENT_TYPE_SUFFIXES = ("Timeout", "TimeoutError", "TimeoutException", "ConnectError", "ConnectionError")
+
+def _transient_type(e: BaseException) -> bool:
+    for err in error_chain(e):
+        if isinstance(err, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        if any(cls.__name__.endswith(TRANSIENT_TYPE_SUFFIXES) for cls in type(err).__mro__):
+            return True
+    return False
+
+def classify_error(e: BaseException) -> str:
+    if is_throttle_error(e) or isinstance(e, RepairError):
+        return RETRYABLE
+    if isinstance(e, (ValidationError, json.JSONDecodeError)):
+        return PERMANENT
+    if _transient_type(e):
+        return RETRYABLE
+    code = status_code(e)
+    if code is not None:
+        return RETRYABLE if code >= 500 or code == 408 else PERMANENT
+    names = status_names(e)
+    if names & TRANSIENT_STATUSES:
+        return RETRYABLE
+    if names & PERMANENT_STATUSES:
+        return PERMANENT
+    # anything else (a parse ValueError, a KeyError in our own code) won't change on a re-send
+    return PERMANENT if isinstance(e, (ValueError, TypeError, KeyError)) else RETRYABLE
+
+def backoff(attempt: int, base: float = 1.5, cap: float = 30.0) -> float:
+    """Equal-jitter delay for retry number `attempt` (1-based)."""
+    ceiling = min(cap, base ** attempt)
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+class RetryBudget:
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.attempts = 0
+        self.retries = 0
+        self.denied = 0
+
+    def record_attempt(self):
+        self.attempts += 1
+
+    def try_spend(self) -> bool:
+        if self.retries + 1 > self.min_retries + self.ratio * self.attempts:
+            self.denied += 1
+            return False
+        self.retries += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"first_attempts": self.attempts, "retries": self.retries, "denied": self.denied}
+
+class RetryQueue:
+    def __init__(self):
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()  # ties keep scheduling order
+
+    def push(self, due: float, item: Any):
+        heapq.heappush(self._heap, (due, next(self._seq), item))
+
+    def pop_due(self, now: Optional[float] = None) -> list:
+        now = time.monotonic() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._heap)
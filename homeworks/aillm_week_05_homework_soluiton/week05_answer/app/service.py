@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import signal
+import time
+from typing import NamedTuple, Optional
+
+from app import main as runner
+from app.metrics import metrics
+from app.sinks import dumps
+
+# Long-running extraction service: the same pipeline as app.main, kept warm in
+# one process (model client, cache, rate limiter, hedging history) and fed over
+# HTTP instead of from a CSV.
+#
+#   python -m app.service --port 8080 --max-batch 8 --max-wait-ms 20 [app.main flags]
+#
+#   POST /extract   {"source_id": "...", "ticket_text": "..."} -> {"source_id": "...", "data": {...}}
+#   GET  /metrics   Prometheus text: stage latencies plus queue depth and batch sizes
+#   GET  /healthz
+#
+# Concurrent requests are gathered into micro-batches: a batch closes when it
+# has --max-batch tickets or --max-wait-ms after its first ticket arrived, and
+# goes through runner.aprocess_chunk (one packed LLM call when it has more than
+# one ticket). At most --concurrency batches run at once; while they do, new
+# requests wait in the queue, so batches fill up under load and stay small
+# when traffic is light. A full queue answers 503 instead of piling up latency.
+#
+# Plain asyncio streams rather than an ASGI framework: week05 has no web
+# dependencies, and the service only needs three routes.
+
+logger = logging.getLogger("week05")
+
+MAX_BODY = 1 << 20  # bytes per request body
+METRICS_WINDOW = 10_000  # recent samples per stage behind the p50/p95/p99
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+class Overloaded(Exception):
+    pass
+
+class Pending(NamedTuple):
+    key: str  # unique per request; callers may reuse a source_id
+    ticket_text: str
+    future: asyncio.Future
+    enqueued: float
+
+class MicroBatcher:
+    def __init__(self, max_batch: int = 8, max_wait: float = 0.02, max_queue: int = 1024,
+                 concurrency: int = 8):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.sem = asyncio.Semaphore(concurrency)  # in-flight LLM calls, shared by every batch
+        self._slots = asyncio.Semaphore(concurrency)  # batches in flight
+        self._ids = itertools.count(1)
+        self._getter: Optional[asyncio.Future] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self.max_depth = 0
+        self.in_flight = 0
+        self.batch_sizes = [0] * (max_batch + 1)  # index = batch size
+        self.rejected = 0
+
+    def start(self):
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._collector:
+            self._collector.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, source_id: str, ticket_text: str):
+        """Payload dict for one ticket, or None if extraction failed; raises Overloaded when the queue is full."""
+        future = asyncio.get_running_loop().create_future()
+        item = Pending(f"{source_id}#{next(self._ids)}", ticket_text, future, time.perf_counter())
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded() from None
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return await future
+
+    async def _next(self, timeout: Optional[float]):
+        # the pending get() is kept across calls rather than cancelled on timeout,
+        # so an item can never be taken off the queue and dropped
+        if self._getter is None:
+            self._getter = asyncio.ensure_future(self.queue.get())
+        done, _ = await asyncio.wait({self._getter}, timeout=timeout)
+        if not done:
+            return None
+        item, self._getter = self._getter.result(), None
+        return item
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._next(None)]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self.queue.empty() and self._getter is None:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                item = await self._next(max(0.0, deadline - loop.time()))
+                if item is None:
+                    break
+                batch.append(item)
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        self.batch_sizes[len(batch)] += 1
+        self.in_flight += 1
+        started = time.perf_counter()
+        for item in batch:
+            metrics.observe("queue_wait", started - item.enqueued)
+        try:
+            results = await runner.aprocess_chunk([(item.key, item.ticket_text) for item in batch], self.sem)
+        except Exception as e:
+            logger.error("batch of %d failed: %s", len(batch), e)
+            results = [(item.key, None) for item in batch]
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+        for item, (_, payload) in zip(batch, results):
+            if not item.future.done():  # the client may have gone away
+                item.future.set_result(payload)
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP ticket_queue_depth Requests waiting for a batch.",
+            "# TYPE ticket_queue_depth gauge",
+            f"ticket_queue_depth {self.queue.qsize()}",
+            "# HELP ticket_queue_depth_max Highest queue depth since start.",
+            "# TYPE ticket_queue_depth_max gauge",
+            f"ticket_queue_depth_max {self.max_depth}",
+            "# HELP ticket_batches_in_flight Batches being extracted.",
+            "# TYPE ticket_batches_in_flight gauge",
+            f"ticket_batches_in_flight {self.in_flight}",
+            "# HELP ticket_requests_rejected_total Requests answered 503 because the queue was full.",
+            "# TYPE ticket_requests_rejected_total counter",
+            f"ticket_requests_rejected_total {self.rejected}",
+            "# HELP ticket_batch_size Tickets per dispatched micro-batch.",
+            "# TYPE ticket_batch_size histogram",
+        ]
+        cumulative = 0
+        for size in range(1, self.max_batch + 1):
+            cumulative += self.batch_sizes[size]
+            lines.append(f'ticket_batch_size_bucket{{le="{size}"}} {cumulative}')
+        lines.append(f'ticket_batch_size_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"ticket_batch_size_sum {sum(n * c for n, c in enumerate(self.batch_sizes))}")
+        lines.append(f"ticket_batch_size_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+class Service:
+    def __init__(self, batcher: MicroBatcher, run_id: str):
+        self.batcher = batcher
+        self.run_id = run_id
+
+    async def route(self, method: str, path: str, body: bytes):
+        """(status, content_type, body bytes, extra headers)."""
+        path = path.split("?", 1)[0]
+        if path == "/extract":
+            if method != "POST":
+                return _json(405, {"error": "use POST"})
+            return await self.extract(body)
+        if path == "/metrics" and method == "GET":
+            text = metrics.prometheus_text(self.run_id) + self.batcher.prometheus_text()
+            return 200, "text/plain; version=0.0.4", text.encode("utf-8"), {}
+        if path == "/healthz" and method == "GET":
+            return _json(200, {"status": "ok", "queue_depth": self.batcher.queue.qsize()})
+        return _json(404, {"error": f"no route for {method} {path}"})
+
+    async def extract(self, body: bytes):
+        try:
+            request = json.loads(body)
+            source_id, ticket_text = str(request["source_id"]), request["ticket_text"]
+            if not isinstance(ticket_text, str):
+                raise TypeError("ticket_text must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            return _json(400, {"error": f"expected {{source_id, ticket_text}}: {e}"})
+        started = time.perf_counter()
+        try:
+            payload = await self.batcher.submit(source_id, ticket_text)
+        except Overloaded:
+            return _json(503, {"error": "queue full"}, {"Retry-After": "1"})
+        finally:
+            metrics.observe("request", time.perf_counter() - started)
+        if payload is None:
+            return _json(502, {"source_id": source_id, "error": "extraction failed"})
+        return _json(200, {"source_id": source_id, "data": payload})
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # minimal HTTP/1.1: Content-Length bodies, keep-alive unless the client says close
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await _respond(writer, *_json(413, {"error": f"body over {MAX_BODY} bytes"}), keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await _respond(writer, *await self.route(method, path, body), keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+def _json(status: int, obj, headers=None):
+    return status, "application/json", dumps(obj).encode("utf-8"), headers or {}
+
+async def _respond(writer, status: int, content_type: str, body: bytes, headers: dict, keep_alive: bool = True):
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.service",
+        description="Serve ticket extraction over HTTP with dynamic micro-batching. "
+                    "Other flags (--concurrency, --cache, --rpm, --hedge, ...) are the same as app.main.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch", type=int, default=8,
+                        help="max tickets per micro-batch / packed LLM call (default: 8)")
+    parser.add_argument("--max-wait-ms", type=float, default=20.0,
+                        help="max time a batch waits for more tickets after its first (default: 20)")
+    parser.add_argument("--max-queue", type=int, default=1024,
+                        help="queued requests before new ones get 503 (default: 1024)")
+    args, rest = parser.parse_known_args(argv)
+    # the pipeline flags come from app.main; it wants a CSV path, which the service never reads
+    pipeline = runner.parse_args(["-"] + rest)
+    return args, pipeline
+
+async def serve(args, pipeline):
+    runner.configure(pipeline)
+    runner.llm_chain.ensure_llm()  # build the client now rather than on the first request
+    metrics.max_samples = METRICS_WINDOW
+    batcher = MicroBatcher(args.max_batch, args.max_wait_ms / 1000, args.max_queue, pipeline.concurrency)
+    service = Service(batcher, run_id="service")
+    batcher.start()
+    server = await asyncio.start_server(service.handle, args.host, args.port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info("Serving on http://%s:%d (max batch %d, max wait %.0f ms, concurrency %d)",
+                args.host, args.port, args.max_batch, args.max_wait_ms, pipeline.concurrency)
+    async with server:
+        await stop.wait()
+        server.close()
+        # finish what was already taken off the queue
+        await batcher.stop()
+    if runner.cache is not None:
+        runner.cache.close()
+    logger.info("Stopped. %s", json.dumps(metrics.summary()["stages"].get("request", {})))
+
+def main(argv=None):
+    args, pipeline = parse_args(argv)
+    if args.max_batch < 1 or args.max_queue < 1:
+        logger.error("--max-batch and --max-queue must be >= 1")
+        raise SystemExit(1)
+    # these act on the CSV stream or the output files, neither of which the service has
+    ignored = [flag for flag, on in (("--dedup", pipeline.dedup), ("--prefilter", pipeline.prefilter),
+                                     ("--priority", pipeline.priority), ("--shards", pipeline.shards != 1),
+                                     ("--resume", pipeline.resume), ("--parquet", pipeline.parquet)) if on]
+    if ignored:
+        logger.error("app.service doesn't support %s", ", ".join(ignored))
+        raise SystemExit(1)
+    # requests always run concurrently, and a micro-batch goes out as one packed call
+    pipeline.use_async, pipeline.pack_size = True, args.max_batch
+    try:
+        runner.validate_args(pipeline)
+    except ValueError as e:
+        logger.error("%s", e)
+        raise SystemExit(1)
+    asyncio.run(serve(args, pipeline))
+
+if __name__ == "__main__":
+    main()
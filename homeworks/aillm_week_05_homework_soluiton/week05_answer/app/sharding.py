@@ -0,0 +1,110 @@
+import heapq
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+# Multi-process runner for --shards N.
+# The parent only splits the CSV into N byte ranges on record boundaries
+# (app.reader.byte_ranges); it never parses the rows. Each worker streams its own
+# range, builds its own Gemini client, runs the normal serial/async loop into
+# logs/shards/<run_id>/shard-<k>.jsonl and sorts that file by source_id. The
+# parent then k-way merges the sorted shards into outputs.jsonl, so the final
+# order is deterministic no matter how the workers were scheduled. Shards are
+# sorted the same way: sorted runs of SORT_RUN_LINES lines, merged, so memory
+# stays bounded however large a shard gets.
+
+SORT_RUN_LINES = 100_000
+
+def _source_id(line: str) -> str:
+    try:
+        return str(json.loads(line)["run_meta"]["source_id"])
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return ""
+
+def sort_shard(path, run_lines: int = SORT_RUN_LINES):
+    path = Path(path)
+    if not path.exists():
+        return
+    runs = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            while batch := list(islice(f, run_lines)):
+                lines = [line if line.endswith("\n") else line + "\n" for line in batch if line.strip()]
+                lines.sort(key=_source_id)  # stable: equal ids keep write order
+                run = path.with_suffix(f".run{len(runs)}.tmp")
+                with open(run, "w", encoding="utf-8") as out:
+                    out.writelines(lines)
+                runs.append(run)
+        tmp = path.with_suffix(".jsonl.tmp")
+        files = [open(run, encoding="utf-8") for run in runs]
+        try:
+            with open(tmp, "w", encoding="utf-8") as out:
+                # heapq.merge takes equal keys from earlier runs first, so the sort stays stable
+                out.writelines(heapq.merge(*files, key=_source_id))
+        finally:
+            for f in files:
+                f.close()
+        os.replace(tmp, path)
+    finally:
+        for run in runs:
+            run.unlink(missing_ok=True)
+
+def merge_shards(shard_paths, out_path) -> int:
+    files = [open(p, encoding="utf-8") for p in shard_paths if Path(p).exists()]
+    try:
+        merged = heapq.merge(*files, key=_source_id)
+        n = 0
+        with open(out_path, "a", encoding="utf-8") as fout:
+            for line in merged:
+                fout.write(line)
+                n += 1
+        return n
+    finally:
+        for f in files:
+            f.close()
+
+def _sum_stats(parts):
+    total = {}
+    for part in parts:
+        for key, value in part.items():
+            if isinstance(value, dict):
+                total[key] = _sum_stats([total.get(key, {}), value])
+            else:
+                total[key] = total.get(key, 0) + value
+    if "cache" in total:
+        lookups = total["cache"]["hits"] + total["cache"]["misses"]
+        total["cache"]["hit_rate"] = total["cache"]["hits"] / lookups if lookups else 0.0
+    if "limiter" in total:
+        # per-process limits don't add up; report the mean
+        total["limiter"]["concurrency_limit"] /= len(parts)
+    return total
+
+def run_sharded(worker, args, run_id: str, byte_ranges, shard_dir, out_path) -> dict:
+    """Run `worker(args, run_id, byte_range, shard_path)` in one process per range and merge."""
+    n_shards = len(byte_ranges)
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    shard_paths = [shard_dir / f"shard-{k}.jsonl" for k in range(n_shards)]
+
+    # spawn, not fork: every worker gets a fresh interpreter and its own gRPC/HTTP client
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_shards, mp_context=ctx) as pool:
+        futures = [pool.submit(worker, args, run_id, byte_ranges[k], shard_paths[k]) for k in range(n_shards)]
+        parts = [f.result() for f in futures]
+
+    merge_shards(shard_paths, out_path)
+    for path in shard_paths:
+        path.unlink(missing_ok=True)
+    shard_dir.rmdir()
+
+    # stage timings are merged sample by sample, everything else is summed
+    shard_metrics = [part.pop("metrics") for part in parts]
+    stats = _sum_stats(parts)
+    merged = shard_metrics[0]
+    for m in shard_metrics[1:]:
+        merged.merge(m)
+    stats["metrics"] = merged
+    return stats
@@ -0,0 +1,273 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Literal, Optional, Union, get_args, get_origin
+
+from app.lazy import lazy_import, optional_import
+
+try:  # optional: ~5-10x faster than the stdlib encoder
+    import orjson
+except ImportError:
+    orjson = None
+
+# only needed for --parquet, so loaded on first use
+pydantic = lazy_import("pydantic")
+models = lazy_import("app.models")
+pa = optional_import("pyarrow")  # optional: columnar output (--parquet)
+offsets = lazy_import("app.offsets")  # sqlite3, only once a sink opens an index
+
+HAVE_PYARROW = pa is not None
+
+# Output sinks for extraction records.
+# A sink receives one record at a time via write_record(); the runner never
+# touches the file directly, so sinks can be swapped (see make_sink).
+
+FSYNC_POLICIES = ("none", "batch", "close")
+
+# record envelope, spaced like the encoder in use so every line looks the same
+if orjson is not None:
+    _HEAD, _MID = '{"run_meta":', ',"data":'
+else:
+    _HEAD, _MID = '{"run_meta": ', ', "data": '
+
+def dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+class Sink:
+    def write_record(self, run_meta: dict, payload: dict, payload_json: Optional[str] = None):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def poll(self):
+        """Commit buffered records whose time limit has passed; the runner calls it while it waits."""
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JsonlSink(Sink):
+    """Append-only JSONL with group commit.
+
+    Lines are buffered in memory and written with one write() once
+    `max_records` / `max_bytes` is reached or `max_delay` seconds have passed
+    since the last flush (checked on every write and on poll(), which the
+    runner calls while it waits for results). fsync policy: "none" (leave it to the OS), "batch"
+    (fsync after every group commit) or "close" (once, at the end). With an
+    `index` (app.offsets.OffsetIndex), each group commit's byte offsets are
+    recorded right after the write. `on_commit(n)` is called after each group
+    commit with the number of records it made durable.
+    """
+
+    def __init__(self, path, max_records: int = 256, max_bytes: int = 1 << 20,
+                 max_delay: float = 1.0, fsync: str = "none", index=None,
+                 on_commit: Optional[Callable[[int], None]] = None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.fsync = fsync
+        self.index = index
+        self.on_commit = on_commit
+        if index is not None:
+            index.sync()  # catch up on lines appended without the index first
+        self.f = open(path, "ab")
+        self._buf = []
+        self._keys = []  # (run_id, source_id, line bytes) per buffered line, with an index
+        self._buf_bytes = 0
+        self._last_flush = time.monotonic()
+        self.flushes = 0
+
+    def write_record(self, run_meta: dict, payload: dict, payload_json: Optional[str] = None):
+        if payload_json is None:
+            payload_json = dumps(payload)
+        # payload is already encoded (the runner logs the same string), so only run_meta is new work
+        line = (_HEAD + dumps(run_meta) + _MID + payload_json + "}\n").encode("utf-8")
+        if self.index is not None:
+            self._keys.append((str(run_meta["run_id"]), str(run_meta["source_id"]), len(line)))
+        self.write_line(line)
+
+    def write_line(self, line: bytes):
+        self._buf.append(line)
+        self._buf_bytes += len(line)
+        if len(self._buf) >= self.max_records or self._buf_bytes >= self.max_bytes:
+            self.flush()
+        else:
+            self.poll()
+
+    def poll(self):
+        # writes alone only check the clock when a record arrives, so a quiet
+        # stretch would otherwise leave the last records unwritten until close()
+        if self._buf and time.monotonic() - self._last_flush >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            records = len(self._buf)
+            data = b"".join(self._buf)
+            self.f.write(data)
+            self._buf.clear()
+            self._buf_bytes = 0
+            self.f.flush()
+            if self.fsync == "batch":
+                os.fsync(self.f.fileno())
+            self.flushes += 1
+            if self.index is not None:
+                self._index_batch(len(data))
+            if self.on_commit is not None:
+                self.on_commit(records)
+        self._last_flush = time.monotonic()
+
+    def _index_batch(self, size: int):
+        # O_APPEND put the batch at whatever the end was; tell() is where it stopped
+        end = self.f.tell()
+        offset = start = end - size
+        entries = []
+        for run_id, source_id, length in self._keys:
+            entries.append((run_id, source_id, offset, length))
+            offset += length
+        self._keys.clear()
+        self.index.add(entries, start, end)
+
+    def close(self):
+        if self.f.closed:
+            return
+        self.flush()
+        if self.fsync != "none":
+            os.fsync(self.f.fileno())
+        self.f.close()
+        if self.index is not None:
+            self.index.close()
+
+def arrow_type(annotation):
+    """Arrow type for a pydantic field annotation (models become structs)."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) != 1:
+            raise TypeError(f"no Arrow type for {annotation!r}")
+        return arrow_type(args[0])
+    if origin is Literal:
+        return pa.string()  # low-cardinality; Parquet dictionary-encodes it
+    if origin in (list, List):
+        return pa.list_(arrow_type(get_args(annotation)[0]))
+    if isinstance(annotation, type) and issubclass(annotation, pydantic.BaseModel):
+        return pa.struct([
+            pa.field(name, arrow_type(field.annotation), nullable=not field.is_required())
+            for name, field in annotation.model_fields.items()
+        ])
+    return {str: pa.string(), float: pa.float64(), int: pa.int64(), bool: pa.bool_()}[annotation]
+
+def record_schema(model=None):
+    model = model or models.TicketExtraction
+    # run_id and date are partition keys: they live in the directory names, not the files
+    meta = [
+        pa.field("source_id", pa.string(), nullable=False),
+        pa.field("ts", pa.timestamp("ms", tz="UTC"), nullable=False),
+        pa.field("dedup_of", pa.string()),
+    ]
+    return pa.schema(meta + list(arrow_type(model)))
+
+class ParquetSink(Sink):
+    """Parquet dataset partitioned as <root>/run_id=<id>/date=<YYYY-MM-DD>/part-*.parquet.
+
+    Records are buffered and written as one row group per `row_group_size`
+    records. A part file is only complete once its footer is written on
+    close(), so it is written under a `_` prefix (skipped by Arrow dataset
+    discovery) and renamed then. flush() is therefore a no-op: outputs.jsonl
+    stays the durable record, and `python -m app.export_parquet` rebuilds the
+    dataset from it after a hard crash.
+    """
+
+    def __init__(self, root, row_group_size: int = 10_000, compression: str = "zstd"):
+        if pa is None:
+            raise RuntimeError("--parquet needs pyarrow: pip install 'week05-answer[parquet]'")
+        self.root = Path(root)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = record_schema()
+        self._rows = {}     # (run_id, date) -> buffered rows
+        self._writers = {}  # (run_id, date) -> (ParquetWriter, tmp path, final path)
+        self.row_groups = 0
+
+    def write_record(self, run_meta: dict, payload: dict, payload_json: Optional[str] = None):
+        ts = run_meta["ts"]
+        date = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+        key = (str(run_meta["run_id"]), date)
+        rows = self._rows.setdefault(key, [])
+        rows.append({"source_id": str(run_meta["source_id"]), "ts": int(ts * 1000),
+                     "dedup_of": run_meta.get("dedup_of"), **payload})
+        if len(rows) >= self.row_group_size:
+            self._write_row_group(key)
+
+    def _writer(self, key):
+        if key not in self._writers:
+            run_id, date = key
+            part_dir = self.root / f"run_id={run_id}" / f"date={date}"
+            part_dir.mkdir(parents=True, exist_ok=True)
+            name = f"part-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet"
+            tmp = part_dir / ("_" + name)
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(tmp, self.schema, compression=self.compression)
+            self._writers[key] = (writer, tmp, part_dir / name)
+        return self._writers[key][0]
+
+    def _write_row_group(self, key):
+        rows = self._rows.pop(key, None)
+        if rows:
+            table = pa.Table.from_pylist(rows, schema=self.schema)
+            self._writer(key).write_table(table, row_group_size=len(rows))
+            self.row_groups += 1
+
+    def close(self):
+        for key in list(self._rows):
+            self._write_row_group(key)
+        for writer, tmp, final in self._writers.values():
+            writer.close()
+            os.replace(tmp, final)
+        self._writers.clear()
+
+class TeeSink(Sink):
+    """Fans every record out to several sinks."""
+
+    def __init__(self, *sinks: Sink):
+        self.sinks = sinks
+
+    def write_record(self, run_meta: dict, payload: dict, payload_json: Optional[str] = None):
+        for sink in self.sinks:
+            sink.write_record(run_meta, payload, payload_json)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def poll(self):
+        for sink in self.sinks:
+            sink.poll()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+def make_sink(path, args, on_commit: Optional[Callable[[int], None]] = None) -> Sink:
+    # shard files are re-sorted before the merge, so only the final outputs.jsonl is indexed
+    index = None if args.no_index or args.shards > 1 else offsets.OffsetIndex(path)
+    sink = JsonlSink(path, max_records=args.sink_batch, max_delay=args.sink_interval, fsync=args.fsync,
+                     index=index, on_commit=on_commit)
+    if args.parquet:
+        return TeeSink(sink, ParquetSink(args.parquet, row_group_size=args.parquet_row_group))
+    return sink
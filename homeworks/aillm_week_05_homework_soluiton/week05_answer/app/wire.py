@@ -0,0 +1,52 @@
+from pydantic import create_model
+
+from app.models import Entities, TicketExtraction
+
+# Compact wire format for structured output (--wire compact).
+# The model writes short keys and leaves out entities it did not find:
+#   {"it": "billing", "u": "high", "c": "phone", "e": {"a": 200}, "s": "...", "st": "open"}
+# instead of spelling out every field name and five nested nulls. expand() maps
+# that back onto the TicketExtraction field names right after parsing, so
+# normalization, repair and validation see the usual payload. compact() is the
+# inverse (used by app.fake_llm and app.bench_wire); expand(compact(x)) == x.
+
+FIELD_KEYS = {
+    "issue_type": "it", "urgency": "u", "channel": "c", "entities": "e",
+    "summary": "s", "status_suggestion": "st",
+}
+ENTITY_KEYS = {
+    "amount": "a", "invoice_period": "p", "ticket_id": "t", "device": "d", "address_move": "m",
+}
+_FIELD_NAMES = {short: name for name, short in FIELD_KEYS.items()}
+_ENTITY_NAMES = {short: name for name, short in ENTITY_KEYS.items()}
+
+# schemas for with_structured_output(); a KeyError here means a field was added
+# to TicketExtraction/Entities without a short key
+CompactEntities = create_model(
+    "CompactEntities",
+    **{ENTITY_KEYS[name]: (field.annotation, None) for name, field in Entities.model_fields.items()},
+)
+CompactTicketExtraction = create_model(
+    "CompactTicketExtraction",
+    **{FIELD_KEYS[name]: (CompactEntities if name == "entities" else field.annotation, ...)
+       for name, field in TicketExtraction.model_fields.items()},
+)
+
+def expand(data):
+    """Compact payload -> TicketExtraction field names; full-name keys pass through."""
+    if not isinstance(data, dict):
+        return data
+    out = {_FIELD_NAMES.get(key, key): value for key, value in data.items()}
+    entities = out.get("entities")
+    if entities is None or isinstance(entities, dict):
+        given = {_ENTITY_NAMES.get(key, key): value for key, value in (entities or {}).items()}
+        out["entities"] = {**dict.fromkeys(ENTITY_KEYS), **given}
+    return out
+
+def compact(payload: dict) -> dict:
+    """TicketExtraction payload -> compact wire form, null entities dropped."""
+    out = {FIELD_KEYS.get(key, key): value for key, value in payload.items() if key != "entities"}
+    entities = payload.get("entities") or {}
+    out[FIELD_KEYS["entities"]] = {ENTITY_KEYS.get(key, key): value
+                                   for key, value in entities.items() if value is not None}
+    return out
@@ -0,0 +1,29 @@
+import csv
+import logging
+
+import pytest
+
+from app import llm_chain
+from app import main as runner
+from app.fake_llm import CANNED_PAYLOADS, FakeTicketChatModel
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    """A working directory with logs/ and the simulated model; run.log of the repo is left alone."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    logger = logging.getLogger("week05")
+    for handler in [h for h in logger.handlers if isinstance(h, logging.FileHandler)]:
+        monkeypatch.setattr(handler, "emit", lambda record: None)
+    llm_chain.set_llm(FakeTicketChatModel(latency_ms=0, latency_sigma=0, seed=0))
+    yield tmp_path
+    runner.cache = None
+
+def write_csv(path, n: int):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["user_id", "sikayet", "created_at"])
+        for i in range(n):
+            payload = CANNED_PAYLOADS[i % len(CANNED_PAYLOADS)]
+            writer.writerow([f"T{i:04d}", f"{payload['summary']} ({i})", "2025-08-28 03:14"])
+    return str(path)
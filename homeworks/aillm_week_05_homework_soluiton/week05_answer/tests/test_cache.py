@@ -0,0 +1,33 @@
+from app.cache import TicketCache
+
+def _rows(cache) -> int:
+    return cache.conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+def test_max_entries_keeps_a_running_count(tmp_path):
+    cache = TicketCache(tmp_path / "cache.sqlite3", "ns", max_entries=200)
+    for i in range(500):
+        cache.put(f"ticket {i}", {"i": i})
+        assert _rows(cache) <= 200
+        assert cache._count == _rows(cache)
+    # replacing an entry doesn't grow the table
+    cache.put("ticket 499", {"i": -1})
+    assert cache._count == _rows(cache)
+    assert cache.get("ticket 499") == {"i": -1}
+    # the most recent entries survive eviction
+    assert cache.get("ticket 450") == {"i": 450}
+    assert cache.get("ticket 0") is None
+    cache.close()
+
+def test_count_is_loaded_at_open_and_resynced_on_eviction(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    first = TicketCache(path, "ns", max_entries=100)
+    other = TicketCache(path, "ns", max_entries=100)  # e.g. a second shard worker
+    for i in range(150):
+        first.put(f"a {i}", {"i": i})
+        other.put(f"b {i}", {"i": i})
+    assert _rows(first) <= 100 + other._evict_batch
+    first.close()
+    other.close()
+    reopened = TicketCache(path, "ns", max_entries=100)
+    assert reopened._count == _rows(reopened)
+    reopened.close()
@@ -0,0 +1,26 @@
+import json
+
+from app import main as runner
+from app.checkpoint import load_manifest
+from app.sinks import JsonlSink
+
+from conftest import write_csv
+
+def test_manifest_leaves_group_commits_to_the_sink(run_dir, monkeypatch):
+    commits = []
+    flush = JsonlSink.flush
+    def recording_flush(self):
+        if self._buf:
+            commits.append(len(self._buf))
+        flush(self)
+    monkeypatch.setattr(JsonlSink, "flush", recording_flush)
+
+    csv_path = write_csv(run_dir / "tickets.csv", 300)
+    runner.main([csv_path, "--sink-batch", "256", "--sink-interval", "60", "--no-index"])
+
+    assert commits == [256, 44]
+    with open(run_dir / "logs" / "outputs.jsonl", encoding="utf-8") as f:
+        run_id = json.loads(f.readline())["run_meta"]["run_id"]
+    manifest = load_manifest(run_dir / "logs" / "runs" / f"{run_id}.json")
+    assert manifest["done"] == 300
+    assert manifest["status"] == "completed"
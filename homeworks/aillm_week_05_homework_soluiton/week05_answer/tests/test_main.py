@@ -0,0 +1,26 @@
+import json
+
+from app import main as runner
+from app.checkpoint import load_manifest
+
+from conftest import write_csv
+
+def _manifests(run_dir):
+    return [load_manifest(path) for path in sorted((run_dir / "logs" / "runs").glob("*.json"))]
+
+def test_main_twice_in_one_process(run_dir):
+    csv_path = write_csv(run_dir / "tickets.csv", 12)
+    runner.main([csv_path, "--no-index", "--dedup"])
+    runner.main([csv_path, "--no-index"])
+
+    manifests = _manifests(run_dir)
+    assert len(manifests) == 2
+    assert [m["status"] for m in manifests] == ["completed", "completed"]
+    assert [m["done"] for m in manifests] == [12, 12]
+    assert runner.run_stats["read"] == 12
+    assert runner.dedup_index is None  # the first run's --dedup is not carried over
+
+    summary = json.loads((run_dir / "logs" / "run_summary.json").read_text(encoding="utf-8"))
+    assert summary["stages"]["row"]["count"] == 12
+    with open(run_dir / "logs" / "outputs.jsonl", encoding="utf-8") as f:
+        assert sum(1 for _ in f) == 24
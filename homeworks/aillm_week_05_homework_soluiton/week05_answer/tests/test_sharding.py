@@ -0,0 +1,34 @@
+import json
+import random
+
+import pytest
+
+from app import main as runner
+from app.checkpoint import RunManifest
+from app.sharding import sort_shard
+
+from conftest import write_csv
+
+def _line(source_id: str, n: int) -> str:
+    return json.dumps({"run_meta": {"run_id": "r", "source_id": source_id}, "data": {"n": n}}) + "\n"
+
+def test_sort_shard_in_bounded_runs_is_sorted_and_stable(tmp_path):
+    ids = [f"T{i:03d}" for i in range(50)] * 2  # every id twice: the first written must stay first
+    random.Random(0).shuffle(ids)
+    path = tmp_path / "shard-0.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(_line(sid, n) for n, sid in enumerate(ids))
+
+    sort_shard(path, run_lines=7)
+
+    records = [json.loads(line) for line in open(path, encoding="utf-8")]
+    keys = [(r["run_meta"]["source_id"], r["data"]["n"]) for r in records]
+    assert keys == sorted(keys)
+    assert len(records) == 100
+    assert [p.name for p in tmp_path.iterdir()] == ["shard-0.jsonl"]  # run files are gone
+
+def test_resume_refuses_another_shard_count(run_dir):
+    csv_path = write_csv(run_dir / "tickets.csv", 8)
+    RunManifest(runner.RUNS_DIR, "run-1", csv_path, total_rows=None, shards=4)
+    with pytest.raises(SystemExit):
+        runner.main([csv_path, "--resume", "run-1", "--shards", "2", "--no-index"])
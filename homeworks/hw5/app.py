@@ -60,27 +60,28 @@ os.makedirs("logs", exist_ok=True)
 log_path = "logs/outputs.jsonl"
 run_id = str(uuid.uuid4())
 
-for idx, row in df.iterrows():
-    ticket_text = row["ticket_text"] if "ticket_text" in row else row.iloc[0]
-    print(f"\n--- Processing Ticket #{idx} ---")
-    print(f"Ticket text:\n{ticket_text}\n")
-
-    try:
-        response: TicketExtraction = structured_llm.invoke([
-            ("system", "You are an assistant that extracts structured data from customer support tickets."),
-            ("human", f"Extract structured data according to the provided schema from this ticket:\n{ticket_text}")
-        ])
-
-        # Terminale pretty print JSON
-        print(json.dumps(response.model_dump(), indent=2))
-
-        # Log dosyasına kaydet (append)
-        with open(log_path, "a") as f:
-            f.write(json.dumps({
+# Log dosyasını bir kez aç; her ticket için yeniden açmak gereksiz I/O
+with open(log_path, "a", encoding="utf-8") as log_file:
+    for idx, row in df.iterrows():
+        ticket_text = row["ticket_text"] if "ticket_text" in row else row.iloc[0]
+        print(f"\n--- Processing Ticket #{idx} ---")
+        print(f"Ticket text:\n{ticket_text}\n")
+
+        try:
+            response: TicketExtraction = structured_llm.invoke([
+                ("system", "You are an assistant that extracts structured data from customer support tickets."),
+                ("human", f"Extract structured data according to the provided schema from this ticket:\n{ticket_text}")
+            ])
+
+            # Terminale pretty print JSON
+            print(json.dumps(response.model_dump(), indent=2))
+
+            # Log dosyasına kaydet (append)
+            log_file.write(json.dumps({
                 "run_id": run_id,
                 "source_id": idx,
                 "data": response.model_dump()
             }) + "\n")
 
-    except Exception as e:
-        print(f"Error processing ticket {idx}: {e}")
+        except Exception as e:
+            print(f"Error processing ticket {idx}: {e}")